@@ -0,0 +1,28 @@
+import pygame
+
+# Process-wide cache of the images in images/. Each image file is loaded once, and each size it is
+# scaled to is scaled once, so all objects of a kind (and all boards) share the same surfaces.
+# Once a display mode is set, images are converted to the display's pixel format (convert_alpha for
+# PNGs, which carry transparency, convert otherwise), which makes blitting them much faster. Images
+# loaded before that are cached separately, so they are converted when first used with a display.
+loaded_images = dict()  # (path, converted) -> surface
+scaled_images = dict()  # (path, converted, (width, height)) -> surface
+
+
+def load_image(path):
+    converted = pygame.display.get_surface() is not None  # convert() needs a display mode
+    key = (path, converted)
+    if key not in loaded_images:
+        img = pygame.image.load(path)
+        if converted:
+            img = img.convert_alpha() if path.endswith('.png') else img.convert()
+        loaded_images[key] = img
+    return loaded_images[key]
+
+
+def scaled_image(path, size):
+    converted = pygame.display.get_surface() is not None
+    key = (path, converted, size)
+    if key not in scaled_images:
+        scaled_images[key] = pygame.transform.scale(load_image(path), size)
+    return scaled_images[key]
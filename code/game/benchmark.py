@@ -0,0 +1,286 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # keep stdout to the JSON results
+import numpy as np
+import pygame
+import torch
+from board import Board, STATE_SIZE, NUM_CELLS
+from config import BOARD_WIDTH, BOARD_HEIGHT, DISPLAY_WIDTH, DISPLAY_HEIGHT
+from dqn import QAgent, ReplayMemory
+from game import ACTION_SPACE, BATCH_SIZE, MEM_CAP, OPTIMIZE_RATE, GAMMA, UPDATE_RATE, EPSILON_HI
+from level_config import NUM_LEVELS
+from tile import NUM_TILES
+
+# Throughput of the simulator, feature extraction, replay memory, learner and renderer, on the 10x10 and
+# 20x20 boards. Every benchmark times single calls and reports calls per second and latency percentiles:
+#   board_init/level_<n>    Board construction (headless) of every level
+#   update_board/level_<n>  one timestep of every level, after a random move of the chicken
+#   extract_features        one-hot features of the chicken's window
+#   replay_push, replay_sample, replay_push_compact, replay_sample_compact
+#                           ReplayMemory of MEM_CAP transitions with one-hot or uint8 states, batches of BATCH_SIZE
+#   optimize_model, update_target_weights
+#                           QAgent training step and soft target update, as game.py configures the agent
+#   draw_screen             redraw after one timestep, on SDL's dummy video driver (no window)
+#
+# Usage: python3 benchmark.py (prints the results as JSON)
+# Usage if you want the results saved: python3 benchmark.py --out results.json
+# Usage if you want to catch regressions: python3 benchmark.py --baseline results.json [--tolerance 0.2]
+#   (compares median latencies, prints them and exits with 1 if any is more than 20% above the baseline)
+# Usage if you want steadier numbers on a noisy machine: python3 benchmark.py --rounds 5
+# (runs itself once per board size and round, since the board size is fixed at import time by --mini.
+# Machine speed drifts over seconds, so the rounds alternate between the sizes and every benchmark reports
+# the statistics of its round with the lowest median, along with the median of every round)
+
+NUM_WARMUP = 10
+NUM_CALLS = 200
+NUM_INIT_CALLS = 20  # boards constructed per level
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_ROUNDS = 3  # runs of the whole suite, each benchmark reports its fastest
+BENCH_LEVEL = NUM_LEVELS  # level of the benchmarks that run on a single board
+
+
+# Statistics of per-call times in seconds
+def summarize(times):
+    times_ms = 1000 * np.array(times)
+    return {
+        "calls": len(times_ms),
+        "per_sec": len(times_ms) / float(np.sum(times)),
+        "mean_ms": float(np.mean(times_ms)),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p90_ms": float(np.percentile(times_ms, 90)),
+        "p99_ms": float(np.percentile(times_ms, 99))
+    }
+
+
+# Times `num_calls` calls of `fn` after `NUM_WARMUP` untimed ones. `prepare` is called untimed before each call
+def time_calls(fn, num_calls=NUM_CALLS, prepare=None):
+    times = list()
+    for i in range(NUM_WARMUP + num_calls):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        fn()
+        if i >= NUM_WARMUP:
+            times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def random_move(board, rng):
+    board.chicken.move(rng.choice(ACTION_SPACE))
+
+
+def bench_boards(results, mini, rng):
+    for level in range(1, NUM_LEVELS + 1):
+        seeds = iter(range(NUM_WARMUP + NUM_INIT_CALLS))
+        results[f"board_init/level_{level}"] = time_calls(lambda: Board(level, mini=mini, headless=True, \
+                                                                         seed=next(seeds)), NUM_INIT_CALLS)
+
+    for level in range(1, NUM_LEVELS + 1):
+        board = Board(level, mini=mini, headless=True, seed=level)
+        board.update_board()
+        results[f"update_board/level_{level}"] = time_calls(board.update_board, \
+                                                             prepare=lambda: random_move(board, rng))
+
+    board = Board(BENCH_LEVEL, mini=mini, headless=True, seed=0)
+    board.update_board()
+    out = torch.empty(1, STATE_SIZE)
+    results["extract_features"] = time_calls(lambda: board.extract_features(out), \
+                                             prepare=lambda: (random_move(board, rng), board.update_board()))
+
+
+# (state, next_state) pairs of a random walk on a board, as one-hot features or uint8 tile windows
+def play_transitions(mini, rng, num_transitions, compact):
+    board = Board(BENCH_LEVEL, mini=mini, headless=True, seed=0)
+    board.update_board()
+    transitions = list()
+    state = board.extract_tile_window().copy()
+    for _ in range(num_transitions):
+        random_move(board, rng)
+        board.update_board()
+        next_state = board.extract_tile_window().copy()
+        transitions.append((state, next_state))
+        state = next_state
+
+    if compact:
+        return [(torch.from_numpy(s).view(1, -1), torch.from_numpy(n).view(1, -1)) for s, n in transitions]
+    tile_onehot = torch.eye(NUM_TILES)
+    return [(tile_onehot[torch.from_numpy(s).long()].view(1, -1), \
+             tile_onehot[torch.from_numpy(n).long()].view(1, -1)) for s, n in transitions]
+
+
+def bench_replay(results, mini, rng):
+    for compact in [False, True]:
+        suffix = '_compact' if compact else ''
+        memory = ReplayMemory(MEM_CAP, NUM_CELLS if compact else STATE_SIZE, \
+                              dtype=torch.uint8 if compact else torch.float32, \
+                              generator=torch.Generator().manual_seed(0))
+        transitions = play_transitions(mini, rng, NUM_WARMUP + NUM_CALLS, compact)
+        pushes = iter(transitions)
+        action, reward = torch.tensor([[0]]), torch.tensor([0.0])
+
+        def push():
+            state, next_state = next(pushes)
+            memory.push(state, action, next_state, reward)
+
+        results["replay_push" + suffix] = time_calls(push)
+        while len(memory) < MEM_CAP:  # sample from a full memory, as in a long run
+            state, next_state = transitions[len(memory) % len(transitions)]
+            memory.push(state, action, next_state, reward)
+        results["replay_sample" + suffix] = time_calls(lambda: memory.sample(BATCH_SIZE))
+
+
+def bench_learner(results, mini, rng):
+    agent = QAgent(STATE_SIZE, len(ACTION_SPACE), ACTION_SPACE, mem_cap=MEM_CAP, batch_size=BATCH_SIZE, \
+                   op_lr=OPTIMIZE_RATE, epsilon=EPSILON_HI, gamma=GAMMA, weight_update_rate=UPDATE_RATE, seed=0)
+    for state, next_state in play_transitions(mini, rng, 4 * BATCH_SIZE, False):
+        agent.memory.push(state, torch.tensor([[rng.randrange(len(ACTION_SPACE))]]), next_state, \
+                          torch.tensor([rng.random()]))
+
+    results["optimize_model"] = time_calls(agent.optimize_model)
+    results["update_target_weights"] = time_calls(agent.update_target_weights)
+
+
+def bench_renderer(results, mini, rng):
+    pygame.init()
+    screen = pygame.display.set_mode([DISPLAY_WIDTH, DISPLAY_HEIGHT])
+    board = Board(BENCH_LEVEL, mini=mini, seed=0)
+    board.update_board()
+    board.draw_screen(screen)  # the first call draws the whole screen
+    results["draw_screen"] = time_calls(lambda: board.draw_screen(screen), \
+                                        prepare=lambda: (random_move(board, rng), board.update_board()))
+    pygame.quit()
+
+
+# Per benchmark, the statistics of the round with the lowest median and the medians of all rounds
+def best_rounds(rounds):
+    best = dict()
+    for name in rounds[0]:
+        best[name] = dict(min((results[name] for results in rounds), key=lambda stats: stats["p50_ms"]))
+        best[name]["round_p50_ms"] = [results[name]["p50_ms"] for results in rounds]
+    return best
+
+
+# Compares median latencies with `baseline` (results of an earlier run), printing every benchmark of the
+# baseline. Returns the number of benchmarks more than `tolerance` slower than their baseline
+def compare(results, baseline, tolerance):
+    num_regressions = 0
+    for size, base_results in baseline["boards"].items():
+        for name, base in base_results.items():
+            current = results["boards"].get(size, dict()).get(name)
+            if current is None:
+                sys.stderr.write(f'{size} {name}: missing from this run\n')
+                continue
+            ratio = current["p50_ms"] / base["p50_ms"] if base["p50_ms"] > 0 else 1.0
+            regressed = ratio > 1 + tolerance
+            num_regressions += regressed
+            sys.stderr.write(f'{size} {name}: {base["p50_ms"]:.4f} -> {current["p50_ms"]:.4f} ms ' \
+                             f'({ratio:.2f}x){"  REGRESSION" if regressed else ""}\n')
+    return num_regressions
+
+
+def run_single():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # draw without a window
+    torch.set_num_threads(1)
+    mini = '--mini' in sys.argv
+    rng = random.Random(0)
+
+    results = dict()
+    bench_boards(results, mini, rng)
+    bench_replay(results, mini, rng)
+    bench_learner(results, mini, rng)
+    bench_renderer(results, mini, rng)
+    print(json.dumps({f'{BOARD_WIDTH}x{BOARD_HEIGHT}': results}))
+
+
+def main():
+    if '--single' in sys.argv:
+        run_single()
+        return
+
+    out_path = None
+    baseline_path = None
+    tolerance = DEFAULT_TOLERANCE
+    num_rounds = DEFAULT_ROUNDS
+    # command line option for saving the results to a file instead of printing them
+    if '--out' in sys.argv:
+        flag_idx = sys.argv.index('--out')
+        if flag_idx == len(sys.argv) - 1 or sys.argv[flag_idx + 1].startswith('--'):
+            sys.stderr.write('--out needs to be followed by a file\n')
+            exit(1)
+        out_path = sys.argv[flag_idx + 1]
+    # command line option for comparing the results with an earlier run
+    if '--baseline' in sys.argv:
+        flag_idx = sys.argv.index('--baseline')
+        if flag_idx == len(sys.argv) - 1 or sys.argv[flag_idx + 1].startswith('--'):
+            sys.stderr.write('--baseline needs to be followed by a file\n')
+            exit(1)
+        baseline_path = sys.argv[flag_idx + 1]
+        if not os.path.isfile(baseline_path):
+            sys.stderr.write(f'ERROR: baseline {baseline_path} does not exist\n')
+            exit(1)
+    # command line option for the slowdown allowed before a benchmark counts as a regression
+    if '--tolerance' in sys.argv:
+        flag_idx = sys.argv.index('--tolerance')
+        try:
+            tolerance = float(sys.argv[flag_idx + 1])
+        except (IndexError, ValueError):
+            sys.stderr.write('--tolerance needs to be followed by a number\n')
+            exit(1)
+    # command line option for the number of runs of the suite
+    if '--rounds' in sys.argv:
+        flag_idx = sys.argv.index('--rounds')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--rounds needs to be followed by a number\n')
+            exit(1)
+        num_rounds = int(sys.argv[flag_idx + 1])
+        if num_rounds < 1:
+            sys.stderr.write('--rounds needs to be at least 1\n')
+            exit(1)
+
+    results = {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "torch": torch.__version__,
+            "pygame": pygame.version.ver,
+            "torch_threads": 1,
+            "rounds": num_rounds
+        },
+        "boards": dict()
+    }
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    rounds_by_size = dict()
+    for _ in range(num_rounds):
+        for size_args in [['--mini'], []]:
+            output = subprocess.run([sys.executable, sys.argv[0], '--single'] + size_args, env=env, check=True, \
+                                    stdout=subprocess.PIPE, text=True).stdout
+            for size, size_results in json.loads(output.strip().splitlines()[-1]).items():
+                rounds_by_size.setdefault(size, list()).append(size_results)
+    for size, rounds in rounds_by_size.items():
+        results["boards"][size] = best_rounds(rounds)
+
+    if out_path is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(out_path, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline_path is not None:
+        with open(baseline_path, 'r') as file:
+            baseline = json.load(file)
+        num_regressions = compare(results, baseline, tolerance)
+        if num_regressions > 0:
+            sys.stderr.write(f'ERROR: {num_regressions} benchmarks regressed by more than {tolerance:.0%}\n')
+            exit(1)
+
+
+if __name__ == '__main__':
+    main()
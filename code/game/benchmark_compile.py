@@ -0,0 +1,71 @@
+import subprocess
+import sys
+import time
+import numpy as np
+import torch
+from board import STATE_SIZE, NUM_CELLS, one_hot_tiles
+from config import BOARD_WIDTH, BOARD_HEIGHT
+from dqn import QAgent
+from game import ACTION_SPACE
+from tile import NUM_TILES
+
+# Compares per-step CPU latency of QAgent's eager and compiled (--compile) modes.
+# Usage: python3 benchmark_compile.py
+# (runs itself once per board size, since the board size is fixed at import time by --mini)
+
+NUM_WARMUP = 20
+NUM_STEPS = 200
+BATCH_SIZE = 128
+ACTION_SIZE = len(ACTION_SPACE)
+NUM_BOARDS = 64  # states per select_actions() call, as for a VecBoard of that many boards
+
+
+def random_state():
+    tiles = np.random.randint(0, NUM_TILES, NUM_CELLS).astype(np.uint8)
+    return one_hot_tiles(tiles, out=torch.empty(1, STATE_SIZE))
+
+
+def time_per_call(fn):  # mean and median milliseconds per call
+    for _ in range(NUM_WARMUP):  # also triggers compilation
+        fn()
+    times = list()
+    for _ in range(NUM_STEPS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return 1000 * np.mean(times), 1000 * np.median(times)
+
+
+def benchmark(compile):
+    torch.manual_seed(0)
+    agent = QAgent(STATE_SIZE, ACTION_SIZE, ACTION_SPACE, batch_size=BATCH_SIZE, epsilon=0, \
+                   compile=compile)
+    for _ in range(4 * BATCH_SIZE):
+        agent.memory.push(random_state(), torch.randint(ACTION_SIZE, (1, 1)), random_state(), torch.randn(1))
+
+    state = random_state()
+    states = torch.cat([random_state() for _ in range(NUM_BOARDS)])
+    act = time_per_call(lambda: agent.select_action(state))
+    batch_act = time_per_call(lambda: agent.select_actions(states))
+    train = time_per_call(agent.optimize_model)
+    return act, batch_act, train
+
+
+def main():
+    if '--single' not in sys.argv:
+        for size_args in [['--mini'], []]:
+            subprocess.run([sys.executable, sys.argv[0], '--single'] + size_args, check=True)
+        return
+
+    torch.set_num_threads(1)
+    print(f'{BOARD_WIDTH}x{BOARD_HEIGHT} board, state size {STATE_SIZE}, batch size {BATCH_SIZE}')
+    for compile in [False, True]:
+        (act_mean, act_median), (batch_mean, batch_median), (train_mean, train_median) = benchmark(compile)
+        mode = 'compiled' if compile else 'eager'
+        print(f'  {mode:>8}: select_action {act_mean:.3f} ms (median {act_median:.3f}), ' \
+              f'select_actions x{NUM_BOARDS} {batch_mean:.3f} ms (median {batch_median:.3f}), ' \
+              f'optimize_model {train_mean:.3f} ms (median {train_median:.3f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,16 @@
 import pygame
 import numpy as np
-import random
 import sys
 from config import DISPLAY_WIDTH, DISPLAY_HEIGHT, TILE_WIDTH, TILE_HEIGHT, BOARD_WIDTH, BOARD_HEIGHT
 from config import DEATHZONE_GROWTHRATE
-from paint import paint_tiles
+from paint import paint_tiles, grid_overlay
 from chicken import Chicken
 from terrain import Terrain, TerrainType
 from objects import DeathZone, Tree, Car, Lilypad, Log, Train, WinZone
 from objects import UpdateStatus
-from objects import CAR_LENGTH, LOG_LENGTH 
+from objects import CAR_LENGTH, LOG_LENGTH, TRAIN_SAFE_TIME, TRAIN_WARN_TIME, TRAIN_DEATH_TIME
 from tile import Tile, NUM_TILES
-from level_config import get_level_config
-from copy import deepcopy 
+from layout import generate_layout, check_layout
 
 TERRAIN_DEFAULTTILE_MAP = {
     TerrainType.GRASS: Tile.GRASS,
@@ -22,17 +20,61 @@ TERRAIN_DEFAULTTILE_MAP = {
     TerrainType.FINISH: Tile.FINISH
 }
 
+LAYOUT_OBJECT_CLASSES = {
+    "tree": Tree,
+    "lilypad": Lilypad,
+    "log": Log,
+    "car": Car,
+    "train": Train
+}
+
 LOOKAHEAD = 4
 LOOKBEHIND= 2
 LOOKLEFT = BOARD_WIDTH // 2
 LOOKRIGHT = BOARD_WIDTH // 2
 NUMFRAMES = 4
 
+WINDOW_WIDTH = LOOKLEFT + LOOKRIGHT + 1
+WINDOW_HEIGHT = LOOKBEHIND + LOOKAHEAD + 1
+WINDOW_SHAPE = (NUMFRAMES, WINDOW_WIDTH, WINDOW_HEIGHT)
+NUM_CELLS = NUMFRAMES * WINDOW_WIDTH * WINDOW_HEIGHT
+STATE_SIZE = NUM_CELLS * NUM_TILES
+
+# row i is the one-hot encoding of tile i
+TILE_ONEHOT = np.eye(NUM_TILES, dtype=np.float32)
+
+TRAIN_CYCLE_LEN = TRAIN_SAFE_TIME + TRAIN_WARN_TIME + TRAIN_DEATH_TIME
+# tile drawn on a train row, indexed by counter % TRAIN_CYCLE_LEN
+TRAIN_PHASE_TILES = np.array([Tile.TRACK] * TRAIN_SAFE_TIME + [Tile.TRACK_WARNING] * TRAIN_WARN_TIME + \
+                             [Tile.TRAIN] * TRAIN_DEATH_TIME, dtype=np.uint8)
+
+
+# One-hot encodes a uint8 array of tiles with a single fancy-index into TILE_ONEHOT. 
+# `out` may be a contiguous float32 numpy array or CPU torch tensor with window.size * NUM_TILES 
+# elements, which is filled in place and returned. 
+def one_hot_tiles(window, out=None):
+    if out is None:
+        out = np.empty(window.size * NUM_TILES, dtype=np.float32)
+
+    buf = out.numpy() if hasattr(out, 'numpy') else out  # torch tensors share memory with .numpy()
+    view = buf.view()
+    view.shape = window.shape + (NUM_TILES,)  # raises rather than silently writing into a copy
+    np.take(TILE_ONEHOT, window, axis=0, out=view, mode='clip')
+
+    return out
+
 class Board:
-    def __init__(self, level, mini=False):
-        self.chicken = Chicken(BOARD_WIDTH // 2, BOARD_HEIGHT - 1)
-        self.config = get_level_config(level, mini)
-        self.terrain, self.river_indices, self.road_indices, self.train_indices = self.__init_terrain()  # description of each row
+    # `layout` (see layout.py) fixes the board's terrain and objects, otherwise a new layout is generated, 
+    # from `seed` if given (the same seed always gives the same board) 
+    def __init__(self, level, mini=False, headless=False, layout=None, seed=None):
+        # a headless board never loads images or draws, so pygame need not be initialized
+        self.headless = headless
+        self.chicken = Chicken(BOARD_WIDTH // 2, BOARD_HEIGHT - 1, headless)
+        if layout is None:
+            layout = generate_layout(level, mini, seed)
+        check_layout(layout)
+        self.layout = layout
+        self.terrain = self.__init_terrain()  # description of each row
         self.objects = self.__init_objects()  # description of each "thing" on the grid
 
         # Error checking 
@@ -46,172 +88,156 @@ class Board:
             sys.stderr.write("ERROR: Object list inputted to Board must contain a WinZone\n")
             exit(1)
 
-        # list keyed by number of frames ago to look 
-        self.tiles = [self.__init_tiles() for _ in range(NUMFRAMES)]
-
-    def __init_terrain(self):
-        # Initialize terrains (just an example for now)
-        terrain = [Terrain(TerrainType.GRASS, y) for y in range(BOARD_HEIGHT)]
-        # invariant: top row MUST be FINISH terrain type (to indicate finish line)
-        terrain[0] = Terrain(TerrainType.FINISH, 0)
-
-        num_rivers = random.choice(self.config["num_rivers"])
-        num_roads = random.choice(self.config["num_roads"])
-        num_trains = random.choice(self.config["num_trains"])
-        terrain_ys = random.sample(range(1, BOARD_HEIGHT - 2), num_rivers + num_roads + num_trains)
-        river_indices = terrain_ys[:num_rivers]
-        road_indices = terrain_ys[num_rivers:num_rivers + num_roads]
-        train_indices = terrain_ys[num_rivers + num_roads:]
-
-        # Disallow two consecutive river indices 
-        river_indices.sort()
-        for i in range(1, len(river_indices)):
-            if river_indices[i] - river_indices[i - 1] == 1: # upon discovery of two consecutive rivers, remove
-                                                             # the second one
-                river_indices[i] = -2 # sentinel value for "invalid", in preparation for removal 
-        river_indices = list(filter(lambda x : x >= 0, river_indices))
-
-        # Assign to the terrain array
-        for i in road_indices:
-            terrain[i] = Terrain(TerrainType.ROAD, i)
-
-        for i in river_indices:
-            terrain[i] = Terrain(TerrainType.RIVER, i)
-
-        for i in train_indices:
-            terrain[i] = Terrain(TerrainType.TRAIN, i)
-
-        return terrain, river_indices, road_indices, train_indices
-
-    def __init_objects(self):
-        # Initialize objects (again, just an example for now)
+        # Objects indexed by kind and (for the moving ones) by row. Trees and lilypads never move, so they 
+        # are drawn into the base tiles once and trees are found by looking up the chicken's cell. 
+        self.cars = [_object for _object in self.objects if isinstance(_object, Car)]
+        self.logs = [_object for _object in self.objects if isinstance(_object, Log)]
+        self.trains = [_object for _object in self.objects if isinstance(_object, Train)]
+        self.zones = [_object for _object in self.objects if isinstance(_object, (WinZone, DeathZone))]
+        self.movers = self.logs + self.cars + self.trains
+        self.movers_by_row = [[] for _ in range(BOARD_HEIGHT)]
+        for mover in self.movers:
+            self.movers_by_row[mover.y].append(mover)
+        self.base_tiles = self.__init_tiles()  # terrain, trees and lilypads 
+        self.tree_cells = np.zeros((BOARD_WIDTH, BOARD_HEIGHT), dtype=bool)
+        for _object in self.objects:
+            if isinstance(_object, (Tree, Lilypad)):
+                _object.draw_tiles(self.base_tiles)
+            if isinstance(_object, Tree):
+                self.tree_cells[_object.x, _object.y] = True
+
+        self.timestep = 0  # number of updates since the board was built or the chicken last died
+        self.__timeline = self.__init_timeline()
+
+        # Preallocated ring buffer of the last NUMFRAMES frames. Every frame is stored twice, at 
+        # `head` and `head + NUMFRAMES`, so that the history is always one contiguous (reversed) 
+        # slice of the buffer, see `tiles` 
+        self.__frames = np.empty((2 * NUMFRAMES, BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)
+        self.__frames[:] = self.__init_tiles()  # bare terrain until the first update
+        self.__head = 0
+        self.__padded = self.__init_padded()
+
+        # Drawing state, see draw_screen() 
+        self.__background = None  # terrain and tile borders, composed on the first draw 
+        self.__grid = None  # tile borders alone, drawn over the sprites 
+        self.__drawn_rects = None  # rects of the sprites on screen, None until the first full draw 
+
+    # View of the frame history keyed by number of frames ago to look, i.e. tiles[0] is the 
+    # current frame. Writing into it writes into the ring buffer. 
+    @property
+    def tiles(self):
+        return self.__frames[self.__head + NUMFRAMES:self.__head:-1]
+
+    def __advance_frames(self):  # start a new current frame from the base tiles 
+        self.__head = (self.__head + 1) % NUMFRAMES
+        self.__frames[self.__head + NUMFRAMES] = self.base_tiles
+
+    def __mirror_frame(self):  # call once the current frame is final
+        self.__frames[self.__head] = self.__frames[self.__head + NUMFRAMES]
+
+    def __init_timeline(self):  # parameters of the moving objects as arrays, see obstacle_timeline()
+        movers = list()
+        for objects, length, tile in [(self.logs, LOG_LENGTH, Tile.LOG), (self.cars, CAR_LENGTH, Tile.CAR)]:
+            params = np.array([[_object.start_x, _object.y, _object.vel, _object.mov_rate] for _object in objects], \
+                              dtype=np.int64).reshape(-1, 4)
+            movers.append((length, tile) + tuple(params.T))
+        trains = np.array([[train.y, train.start_counter] for train in self.trains], dtype=np.int64).reshape(-1, 2)
+
+        return movers, trains.T
+
+    def __init_terrain(self):  # description of each row, from the layout
+        return [Terrain(TerrainType(ttype), y, self.headless) for y, ttype in enumerate(self.layout["terrain"])]
+
+    def __init_objects(self):  # objects described by the layout, between a WinZone and a DeathZone
         objects = [WinZone(0)]
-
-        # Initialize objects based on terrain
-        prev_row_tree_columns = set()
-        prev_row_lily_columns = set()
-
-        for y in range(1, BOARD_HEIGHT - 2):  # Avoiding the first row and last two rows
-            terrain_type = self.terrain[y].ttype
-            current_row_tree_columns = set()
-            current_row_lily_columns = set()
-
-            if terrain_type == TerrainType.GRASS:
-                if random.choice([True, False]):  # Randomly decide to put trees or not
-                    num_trees = random.choice(self.config["num_trees_per_row"])
-
-                    for _ in range(num_trees):
-                        # Avoid columns with lily pads in adjacent rows and already placed trees in the same row
-                        available_columns = [x for x in range(BOARD_WIDTH) if
-                                             x not in prev_row_lily_columns and x not in current_row_tree_columns]
-                        if available_columns:
-                            tree_x = random.choice(available_columns)
-                            objects.append(Tree(tree_x, y))
-                            current_row_tree_columns.add(tree_x)
-
-            elif terrain_type == TerrainType.RIVER:
-                if random.choice(self.config["river_is_lilypad"]):  # Randomly decide between lilypad and log
-                    num_lilypads = random.choice(self.config["num_lilys_per_row"])
-
-                    for _ in range(num_lilypads):
-                        # Avoid columns with trees in adjacent rows and already placed lilypads in the same row
-                        available_columns = [x for x in range(BOARD_WIDTH) if
-                                             x not in prev_row_tree_columns and x not in current_row_lily_columns]
-                        if available_columns:
-                            lily_x = random.choice(available_columns)
-                            objects.append(Lilypad(lily_x, y))
-                            current_row_lily_columns.add(lily_x)
-                else:
-                    num_logs_per_row = random.choice(self.config["num_logs_per_row"])
-                    log_vel = random.choice(self.config["log_vels"])
-                    log_mov_rate = random.choice(self.config["log_mov_rates"])
-                    unavailable_log_xs = [] # logic to ensure no two logs are "on top of each other"
-                    for _ in range(num_logs_per_row):
-                        log_x = random.randint(0, BOARD_WIDTH - 1) 
-                        while log_x in unavailable_log_xs:
-                            log_x = random.randint(0, BOARD_WIDTH - 1)
-                        unavailable_log_xs.extend(range(log_x - LOG_LENGTH, log_x + LOG_LENGTH))
-                        objects.append(Log(log_x, y, log_vel, log_mov_rate))  # Define velocity and move rate
-
-            elif terrain_type == TerrainType.ROAD:
-                num_cars_per_row = random.choice(self.config["num_cars_per_row"])
-                car_vel = random.choice(self.config["car_vels"])
-                car_mov_rate = random.choice(self.config["car_mov_rates"])
-                unavailable_car_xs = [] # logic to ensure no two cars are "on top of each other"
-                for _ in range(num_cars_per_row):
-                    x = random.randint(0, BOARD_WIDTH - 1)
-                    while x in unavailable_car_xs:
-                        x = random.randint(0, BOARD_WIDTH - 1)
-                    unavailable_car_xs.extend(range(x - CAR_LENGTH, x + CAR_LENGTH))
-                    objects.append(Car(x, y, car_vel, car_mov_rate))
-
-            elif terrain_type == TerrainType.TRAIN:
-                # Initialize train objects
-                objects.append(Train(y, random.randint(0, 100)))
-
-            prev_row_tree_columns = current_row_tree_columns
-            prev_row_lily_columns = current_row_lily_columns
-
+        for kind, *params in self.layout["objects"]:
+            objects.append(LAYOUT_OBJECT_CLASSES[kind](*params, headless=self.headless))
         objects.append(DeathZone(DEATHZONE_GROWTHRATE))
 
         return objects
 
     def __init_tiles(self):  # initialize tiles based on terrain ONLY (does not initialize objects)
-        tiles = np.full((BOARD_WIDTH, BOARD_HEIGHT), None)
+        # compact grid of Tile values, indexed [x][y]
+        tiles = np.empty((BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)
 
         for i in range(BOARD_HEIGHT):
-            tiles[:, i] = [TERRAIN_DEFAULTTILE_MAP[self.terrain[i].ttype]] * BOARD_WIDTH
-        # tiles updates tiles based on object locations in update_board(), when object.update_env() is called
+            tiles[:, i] = TERRAIN_DEFAULTTILE_MAP[self.terrain[i].ttype]
+        # objects are drawn over a copy of these tiles every time update_board() is called
 
         return tiles
 
-    def extract_features(self):
-        tile_vector_shape = (NUMFRAMES, LOOKLEFT + LOOKRIGHT + 1, LOOKBEHIND + LOOKAHEAD + 1)
-        bit_vector_shape = (NUMFRAMES, LOOKLEFT + LOOKRIGHT + 1, LOOKBEHIND + LOOKAHEAD + 1, NUM_TILES)
-
-        tile_vector = np.empty(tile_vector_shape, dtype=Tile)
-        for frame in range(NUMFRAMES): # 0 = current frame, 1 = one frame ago, 2 = two frames ago, etc. 
-            for i, x in enumerate(range(self.chicken.x - LOOKLEFT, self.chicken.x + LOOKRIGHT + 1)):
-                for j, y in enumerate(range(self.chicken.y - LOOKBEHIND, self.chicken.y + LOOKAHEAD + 1)):
-                    if x < 0 or x >= BOARD_WIDTH or y < 0:
-                        tile_vector[frame][i][j] = Tile.OOB 
-                    elif y >= BOARD_HEIGHT:
-                        tile_vector[frame][i][j] = Tile.DEATH 
-                    else:
-                        tile_vector[frame][i][j] = self.tiles[frame][x][y]
-        
-        # Convert array of enums to array of bit arrays 
-        bit_vector = np.empty(bit_vector_shape, dtype=int)
-        for frame in range(NUMFRAMES):
-            for i in range(len(tile_vector[frame])):
-                for j in range(len(tile_vector[frame][i])):
-                    bit_vector[frame][i][j] = self.__tile_to_bit_arr(tile_vector[frame][i][j])
-
-        return np.ravel(bit_vector)
-
-    def __tile_to_bit_arr(self, tile):
-        arr = [0] * NUM_TILES 
-        arr[tile.value] = 1
-        return arr 
+    def __init_padded(self):  # frame stack with a LOOK* border around the board
+        padded = np.empty((NUMFRAMES, BOARD_WIDTH + LOOKLEFT + LOOKRIGHT, BOARD_HEIGHT + LOOKBEHIND + LOOKAHEAD), \
+                          dtype=np.uint8)
+
+        # everything below the board is death, everything else off the board is out of bounds 
+        padded[:, :, :LOOKBEHIND] = Tile.OOB
+        padded[:, :, LOOKBEHIND + BOARD_HEIGHT:] = Tile.DEATH
+        padded[:, :LOOKLEFT] = Tile.OOB
+        padded[:, LOOKLEFT + BOARD_WIDTH:] = Tile.OOB
+
+        return padded
 
+    # uint8 window of Tile values centred on the chicken, shape WINDOW_SHAPE 
+    # (0 = current frame, 1 = one frame ago, 2 = two frames ago, etc.)
+    # NOTE: the window is a view that the next call overwrites; copy it to keep it
+    def extract_tile_window(self):
+        # only the interior changes, the border was filled once in __init_padded()
+        self.__padded[:, LOOKLEFT:LOOKLEFT + BOARD_WIDTH, LOOKBEHIND:LOOKBEHIND + BOARD_HEIGHT] = self.tiles
+
+        # board coordinate x sits at padded coordinate x + LOOKLEFT, so the window starts at chicken.x 
+        x, y = self.chicken.x, self.chicken.y
+        return self.__padded[:, x:x + WINDOW_WIDTH, y:y + WINDOW_HEIGHT]
+
+    # one-hot float32 feature vector of length STATE_SIZE, written into `out` if given
+    def extract_features(self, out=None):
+        return one_hot_tiles(self.extract_tile_window(), out)
+
+    # Advances the board by one timestep after the chicken moved. Every frame is drawn from the base tiles, 
+    # so only moving objects are updated, and only the objects in the chicken's row are checked against it. 
     def update_board(self):
         statuses = []  # hold update statuses, can later be used to compute reward in actual learning process
-        died = False
+        chicken = self.chicken
+
+        self.__advance_frames()
+        tiles = self.tiles[0]
+        self.timestep += 1
+
+        # running into a tree undoes the move. Objects used to be updated row by row from the top, so when 
+        # the chicken ran down into a tree, the objects of the row it is put back in had already been checked 
+        # against it in the tree's row: they neither carry nor hit it this timestep 
+        blocked_down = False
+        if self.tree_cells[chicken.x, chicken.y]:
+            tree_y = chicken.y
+            chicken.undo_move()
+            statuses.append(UpdateStatus.NO_MOVEMENT)
+            blocked_down = chicken.y < tree_y
+        row_movers = () if blocked_down else self.movers_by_row[chicken.y]
+
+        # logs about to move carry the chicken along, possibly off the board. They do so in list order, so a log 
+        # the chicken is carried onto carries it again if it comes later in the row 
+        for _object in row_movers:
+            if isinstance(_object, Log) and _object.will_move() and _object.covers(chicken.x):
+                chicken.x += _object.vel
+        if chicken.x < 0 or BOARD_WIDTH <= chicken.x:
+            statuses.append(UpdateStatus.DEATH)
 
-        for i in range(NUMFRAMES - 1, 1, -1):
-            self.tiles[i] = self.tiles[i - 1] 
-        if NUMFRAMES > 1:
-            self.tiles[1] = deepcopy(self.tiles[0])
+        for mover in self.movers:
+            mover.move()
+            mover.draw_tiles(tiles)
 
-        for _object in self.objects:
-            status = _object.update_env(self.tiles[0], self.chicken)
-            statuses.append(status)
+        for _object in row_movers:
+            statuses.append(_object.collide(chicken))
+
+        # the death zone is drawn over everything in its rows 
+        for zone in self.zones:
+            statuses.append(zone.update_env(tiles, chicken))
 
-            if status == UpdateStatus.DEATH:
-                died = True
+        self.__mirror_frame()
+        died = UpdateStatus.DEATH in statuses
 
         # river kill (check tiles)
-        if died != True and self.tiles[0][self.chicken.x][self.chicken.y] == Tile.WATER:
+        if died != True and tiles[chicken.x, chicken.y] == Tile.WATER:
             died = True
             statuses.append(UpdateStatus.DEATH)
         else:
@@ -222,22 +248,93 @@ class Board:
             for _object in self.objects:
                 _object.reset()
             self.chicken.reset()
+            self.timestep = 0
 
         return statuses
 
-    def draw_screen(self, screen):
-        # Draw each terrain first 
+    # Obstacle tiles (what tiles[0] holds) of the `num_steps` timesteps from `start` on, as one 
+    # (num_steps, BOARD_WIDTH, BOARD_HEIGHT) array. Timestep t is the board after t updates since it was 
+    # built or the chicken last died, assuming the chicken does not die in between (see self.timestep). 
+    # Every object moves periodically, so no timestep is simulated: a car or log has moved 
+    # t // mov_rate times, a train is at counter start_counter + t and the death zone has grown 
+    # t // growth_rate rows. 
+    def obstacle_timeline(self, start, num_steps):
+        timesteps = np.arange(start, start + num_steps)
+        steps = np.arange(num_steps)[:, None]
+        grids = np.empty((num_steps, BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)
+        grids[:] = self.base_tiles
+
+        movers, (train_y, train_start) = self.__timeline
+        for length, tile, start_x, y, vel, mov_rate in movers:
+            # right ends of every mover at every timestep, shape (num_steps, num_movers) 
+            x2 = (start_x + length + timesteps[:, None] // mov_rate * vel) % (BOARD_WIDTH + length)
+            for k in range(length):
+                xs = x2 - length + k
+                visible = (0 <= xs) & (xs < BOARD_WIDTH)
+                grids[np.broadcast_to(steps, xs.shape)[visible], xs[visible], \
+                      np.broadcast_to(y, xs.shape)[visible]] = tile
+
+        phases = (train_start + timesteps[:, None]) % TRAIN_CYCLE_LEN
+        grids[steps, :, train_y] = TRAIN_PHASE_TILES[phases][:, :, None]
+
+        deathzone = self.objects[-1]
+        deathzone_y = BOARD_HEIGHT - timesteps // deathzone.growth_rate
+        in_deathzone = np.arange(BOARD_HEIGHT) >= deathzone_y[:, None]
+        grids[np.broadcast_to(in_deathzone[:, None, :], grids.shape)] = Tile.DEATH
+
+        return grids
+
+    def obstacle_tiles(self, t):  # obstacle tiles of timestep t, see obstacle_timeline()
+        return self.obstacle_timeline(t, 1)[0]
+
+    # Jump to timestep t without simulating the timesteps in between: every object is put where t 
+    # updates since the last death leave it and the frame history is redrawn. The chicken stays put. 
+    def seek(self, t):
+        for _object in self.objects:
+            _object.seek(t)
+        self.timestep = t
+
+        # history from the oldest frame, timesteps before the first update are bare terrain as in __init__ 
+        history = self.obstacle_timeline(t - NUMFRAMES + 1, NUMFRAMES)
+        history[:max(NUMFRAMES - t, 0)] = self.__init_tiles()
+        self.__head = 0
+        self.__frames[1:NUMFRAMES + 1] = history  # tiles[k] is self.__frames[NUMFRAMES - k] when head is 0
+        self.__frames[NUMFRAMES + 1:] = self.__frames[1:NUMFRAMES]
+        self.__frames[0] = self.__frames[NUMFRAMES]
+
+    def __init_background(self):  # the static part of the screen: terrain under the tile borders
+        background = pygame.Surface((DISPLAY_WIDTH, DISPLAY_HEIGHT)).convert()
         for terrain in self.terrain:
-            terrain.draw(screen)
+            terrain.draw(background)
+        paint_tiles(background, DISPLAY_WIDTH, DISPLAY_HEIGHT, TILE_WIDTH, TILE_HEIGHT)
 
-        for _object in self.objects:
-            _object.draw(screen)
+        return background
+
+    # Draws terrain, objects, tile borders and then the chicken. The first call draws the whole screen, 
+    # later calls only restore the background under the sprites of the previous draw, redraw the sprites 
+    # and push the changed rects to the display. 
+    def draw_screen(self, screen):
+        if self.headless:
+            return
 
-        # Draw the tiles
-        paint_tiles(screen, DISPLAY_WIDTH, DISPLAY_HEIGHT, TILE_WIDTH, TILE_HEIGHT)
+        if self.__drawn_rects is None:
+            self.__background = self.__init_background()
+            self.__grid = grid_overlay(DISPLAY_WIDTH, DISPLAY_HEIGHT, TILE_WIDTH, TILE_HEIGHT).convert()
+            screen.blit(self.__background, (0, 0))
+        else:
+            for rect in self.__drawn_rects:
+                screen.blit(self.__background, rect, rect)
 
-        # Draw chicken
-        self.chicken.draw(screen)
+        # every sprite is drawn inside an area just restored to the background (or a fresh one), so 
+        # sprites with transparency never blend over their own previous draw 
+        rects = [rect for rect in (_object.draw(screen) for _object in self.objects) if rect is not None]
+        for rect in rects:
+            screen.blit(self.__grid, rect, rect)
+        rects.append(self.chicken.draw(screen))
 
         # Update the display
-        pygame.display.flip()
+        if self.__drawn_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.__drawn_rects + rects)
+        self.__drawn_rects = rects
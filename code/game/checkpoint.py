@@ -0,0 +1,41 @@
+import os
+import sys
+import torch
+from tile import NUM_TILES
+
+# A checkpoint holds the full state of a game.run_levels() run, so that it can continue where it
+# stopped: the agent (networks, AdamW state, replay memory and generators, see QAgent.state_dict()),
+# the run's random state, the results of the finished levels and the progress in the current level
+# (rewards, episode lengths, number of episodes and consecutive wins so far).
+# Replay states are saved as uint8 tile indices, which keeps even a full memory at a few MB.
+
+
+# Writes the checkpoint to a temporary file first and then renames it over `path`, so a crash while
+# saving never leaves a corrupt checkpoint behind
+def save_checkpoint(path, agent, rng, levels, mini, results, level_progress):
+    checkpoint = {
+        "levels": list(levels),
+        "mini": mini,
+        "agent": agent.state_dict(NUM_TILES),
+        "rng": rng.getstate(),
+        "results": results,
+        "level_progress": level_progress
+    }
+
+    with open(path + '.tmp', 'wb') as file:
+        torch.save(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(path, levels, mini):
+    # our own file, which holds python objects (random states) besides tensors
+    checkpoint = torch.load(path, weights_only=False)
+    if checkpoint["levels"] != list(levels) or checkpoint["mini"] != mini:
+        sys.stderr.write(f'ERROR: checkpoint {path} is of a run over levels {checkpoint["levels"]}' \
+                         f'{" (mini)" if checkpoint["mini"] else ""}, not levels {list(levels)}' \
+                         f'{" (mini)" if mini else ""}\n')
+        exit(1)
+
+    return checkpoint
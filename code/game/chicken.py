@@ -1,5 +1,5 @@
-import pygame
 import sys
+from assets import scaled_image
 from config import TILE_WIDTH, TILE_HEIGHT, BOARD_WIDTH, BOARD_HEIGHT
 from enum import Enum
 
@@ -17,7 +17,7 @@ class Action(Enum):
 
 
 class Chicken:
-    def __init__(self, start_x, start_y):
+    def __init__(self, start_x, start_y, headless=False):
         self.last_move = None
         self.x = start_x
         self.y = start_y
@@ -25,7 +25,9 @@ class Chicken:
         self.orig_x = start_x 
         self.orig_y = start_y 
 
-        self.img = pygame.image.load(IMG_PATH)
+        self.img = None
+        if not headless:
+            self.img = scaled_image(IMG_PATH, (TILE_WIDTH, TILE_HEIGHT))
     
     def move(self, direction):
         if direction == Action.LEFT:
@@ -68,7 +70,5 @@ class Chicken:
         self.y = self.orig_y 
 
     def draw(self, screen):
-        self.img = pygame.transform.scale(self.img, (TILE_WIDTH, TILE_HEIGHT))
-
         # Place chicken in designated location on screen
-        screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
+        return screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
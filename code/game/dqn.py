@@ -1,10 +1,13 @@
+import os
 import random
+import sys
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 
-from collections import namedtuple, deque
+from collections import namedtuple
 from itertools import count
 import math 
 
@@ -13,22 +16,297 @@ import math
 # https://pytorch.org/tutorials/intermediate/reinforcement_q_learning.html
 # Many thanks to Pytorch for the resource!
 
-Transition = namedtuple('Transition',
-                        ('state', 'action', 'next_state', 'reward'))
+# A sampled batch of transitions, one stacked tensor per field. `non_final` is False where 
+# next_state was None (its row of next_state is then all zeros). Prioritized memories also return the 
+# importance-sampling `weights` of the transitions and their slot `indices`, see PrioritizedReplayMemory 
+Batch = namedtuple('Batch',
+                   ('state', 'action', 'next_state', 'reward', 'non_final', 'weights', 'indices'),
+                   defaults=(None, None))
 
 class ReplayMemory(object):
-    def __init__(self, capacity):
-        self.memory = deque([], maxlen=capacity)
+    # Transitions live in preallocated tensors and are written in place at a circular cursor, 
+    # so the oldest transition is overwritten once the memory is full. Batches are sampled with 
+    # `generator` (a torch.Generator), or the global torch RNG if None 
+    def __init__(self, capacity, state_size, dtype=torch.float32, generator=None):
+        self.capacity = capacity
+        self.generator = generator
+        self.states = torch.zeros((capacity, state_size), dtype=dtype)
+        self.actions = torch.zeros((capacity, 1), dtype=torch.long)
+        self.next_states = torch.zeros((capacity, state_size), dtype=dtype)
+        self.rewards = torch.zeros(capacity)
+        self.non_final = torch.zeros(capacity, dtype=torch.bool)
+
+        self.cursor = 0  # slot the next transition is written to
+        self.size = 0
 
-    def push(self, *args):
+    def push(self, state, action, next_state, reward):
         # Save a transition 
-        self.memory.append(Transition(*args))
+        i = self.cursor
+        self.states[i] = torch.as_tensor(state).view(-1)
+        self.actions[i] = torch.as_tensor(action).view(-1)
+        if next_state is None:
+            self.next_states[i] = 0
+            self.non_final[i] = False
+        else:
+            self.next_states[i] = torch.as_tensor(next_state).view(-1)
+            self.non_final[i] = True
+        self.rewards[i:i + 1] = reward
 
+        self.cursor = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # Uniformly samples `batch_size` transitions (with replacement) with one index op per field 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        idx = torch.randint(self.size, (batch_size,), generator=self.generator)
+        return Batch(self.states[idx], self.actions[idx], self.next_states[idx], self.rewards[idx], \
+                     self.non_final[idx])
+
+    # The filled part of the memory and the cursor, so that a memory loaded from the snapshot samples exactly 
+    # as this one would. With `num_tiles`, states that are one-hot encodings of tiles (`num_tiles` floats 
+    # per tile) are saved as uint8 tile indices, num_tiles * 4 times smaller; load_snapshot() expands them 
+    def snapshot(self, num_tiles=None):
+        states, next_states = self.states[:self.size], self.next_states[:self.size]
+        compact = num_tiles is not None and self.states.dtype != torch.uint8
+        if compact:
+            states = states.view(self.size, -1, num_tiles).argmax(2).to(torch.uint8)
+            next_states = next_states.view(self.size, -1, num_tiles).argmax(2).to(torch.uint8)
+
+        return {
+            "states": states,
+            "actions": self.actions[:self.size].clone(),
+            "next_states": next_states,
+            "rewards": self.rewards[:self.size].clone(),
+            "non_final": self.non_final[:self.size].clone(),
+            "cursor": self.cursor,
+            "num_tiles": num_tiles if compact else None
+        }
+
+    def load_snapshot(self, snapshot):
+        size = len(snapshot["rewards"])
+        if size > self.capacity:
+            sys.stderr.write(f'ERROR: replay snapshot of {size} transitions does not fit a memory of capacity ' \
+                             f'{self.capacity}\n')
+            exit(1)
+        states, next_states, non_final = snapshot["states"], snapshot["next_states"], snapshot["non_final"]
+        if snapshot["num_tiles"] is not None:
+            tile_onehot = torch.eye(snapshot["num_tiles"])
+            states = tile_onehot[states.long()].view(size, -1)
+            next_states = tile_onehot[next_states.long()].view(size, -1) * non_final.unsqueeze(1)
+
+        self.states[:size] = states
+        self.actions[:size] = snapshot["actions"]
+        self.next_states[:size] = next_states
+        self.rewards[:size] = snapshot["rewards"]
+        self.non_final[:size] = non_final
+        self.cursor = snapshot["cursor"]
+        self.size = size
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
+
+
+# ReplayMemory whose transitions live in fixed-size records of .npy files in the directory `path`, 
+# memory-mapped, so the OS page cache holds whatever fits in RAM and the process's own memory use does 
+# not grow with the capacity. The cursor and size are kept in meta.npy, so a later process that opens the 
+# same directory with `keep` finds the memory as it was left. Otherwise it starts empty over the old files. 
+# Batches are read with sorted indices, so that the reads go through the file in one sweep. 
+class MemmapReplayMemory(ReplayMemory):
+    def __init__(self, path, capacity, state_size, dtype=torch.float32, generator=None, keep=False):
+        self.path = path
+        self.capacity = capacity
+        self.generator = generator
+        os.makedirs(path, exist_ok=True)
+        self.arrays = list()  # the memory-mapped arrays behind the tensors
+
+        state_dtype = torch.empty(0, dtype=dtype).numpy().dtype
+        self.states = self.__open('states', (capacity, state_size), state_dtype)
+        self.actions = self.__open('actions', (capacity, 1), np.int64)
+        self.next_states = self.__open('next_states', (capacity, state_size), state_dtype)
+        self.rewards = self.__open('rewards', (capacity,), np.float32)
+        self.non_final = self.__open('non_final', (capacity,), np.bool_)
+        self.meta = self.__open('meta', (2,), np.int64)  # cursor, size
+
+        if not keep:
+            self.meta[:] = 0
+        self.cursor, self.size = self.meta.tolist()
+
+    # tensor sharing the memory of the memory-mapped .npy file `name`, which is created if needed 
+    def __open(self, name, shape, dtype):
+        file_path = os.path.join(self.path, name + '.npy')
+        if os.path.isfile(file_path):
+            array = np.load(file_path, mmap_mode='r+')
+            if array.shape != shape or array.dtype != dtype:
+                sys.stderr.write(f'ERROR: {file_path} holds a {array.dtype} array of shape {array.shape}, ' \
+                                 f'not {np.dtype(dtype)} {shape} (different capacity or state size?)\n')
+                exit(1)
+        else:
+            array = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=shape)
+        self.arrays.append(array)
+        return array if name == 'meta' else torch.from_numpy(array)
+
+    def push(self, state, action, next_state, reward):
+        super().push(state, action, next_state, reward)
+        self.meta[:] = (self.cursor, self.size)
+
+    def sample(self, batch_size):
+        idx = torch.randint(self.size, (batch_size,), generator=self.generator).sort().values
+        return Batch(self.states[idx], self.actions[idx], self.next_states[idx], self.rewards[idx], \
+                     self.non_final[idx])
+
+    def flush(self):
+        for array in self.arrays:
+            array.flush()
+
+    # The transitions are already on disk, so a snapshot only records where they are, the cursor and the 
+    # size. Transitions pushed after the snapshot stay in the files, in the slots from the snapshot's cursor 
+    # on. Loading it restores the memory exactly unless these slots held transitions of the snapshot, i.e. 
+    # unless the memory was full when the snapshot was taken or wrapped around after it: the later 
+    # transitions are then replayed in place of the ones they overwrote 
+    def snapshot(self, num_tiles=None):
+        self.flush()
+        return {"path": self.path, "cursor": self.cursor, "size": self.size}
+
+    def load_snapshot(self, snapshot):
+        if "path" not in snapshot:  # snapshot of an in-RAM memory
+            super().load_snapshot(snapshot)
+            self.meta[:] = (self.cursor, self.size)
+            return
+        self.cursor, self.size = snapshot["cursor"], snapshot["size"]
+        self.meta[:] = (self.cursor, self.size)
+
+
+# ReplayMemory in shared memory, for processes that push and sample concurrently (see pipeline.py): the 
+# tensors are moved to shared memory, so the memory can be handed to processes started after it is built, 
+# and the cursor and size live in a shared tensor. Pushes and samples take `lock` (a multiprocessing lock), 
+# so a batch never holds a half-written transition 
+class SharedReplayMemory(ReplayMemory):
+    def __init__(self, capacity, state_size, lock, dtype=torch.float32, generator=None):
+        super().__init__(capacity, state_size, dtype, generator)
+        for tensor in (self.states, self.actions, self.next_states, self.rewards, self.non_final):
+            tensor.share_memory_()
+        self.meta = torch.zeros(2, dtype=torch.long).share_memory_()  # cursor, size
+        self.lock = lock
+
+    def push(self, state, action, next_state, reward):
+        with self.lock:
+            self.cursor, self.size = self.meta.tolist()
+            super().push(state, action, next_state, reward)
+            self.meta[:] = torch.tensor((self.cursor, self.size))
+
+    def sample(self, batch_size):
+        with self.lock:
+            self.cursor, self.size = self.meta.tolist()
+            return super().sample(batch_size)
+
+    def __len__(self):
+        return int(self.meta[1])
+
+    # Handed to another process without the generator (which does not pickle), each process samples with its own 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["generator"] = None
+        return state
+
+# Binary tree over `capacity` non-negative priorities, stored in one array: node i has children 2i and 
+# 2i + 1, leaves start at num_leaves and every node holds the sum of its leaves, so the root (node 1) 
+# holds the total. Updates and proportional lookups take O(log n) steps, each done for a whole batch. 
+class SumTree(object):
+    def __init__(self, capacity):
+        self.num_leaves = 2  # at least two, so that the root (1) is never a leaf 
+        while self.num_leaves < capacity:
+            self.num_leaves *= 2
+        self.tree = np.zeros(2 * self.num_leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.num_leaves]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.num_leaves
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while True:  # refresh the sums on the paths to the root, one tree level per iteration
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                return
+            nodes = np.unique(nodes // 2)
+
+    # Index of the leaf whose prefix-sum interval contains each of `values` (each in [0, total)) 
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.num_leaves:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= self.tree[left] * go_right
+            nodes = left + go_right
+        return nodes - self.num_leaves
+
+
+# ReplayMemory that samples transitions in proportion to priority ** alpha instead of uniformly, where a 
+# transition's priority is its last absolute TD error (plus `eps`), and new transitions get the highest 
+# priority seen so far. Batches carry importance-sampling weights (N * P(i)) ** -beta, normalized by their 
+# maximum, which correct the loss for the non-uniform sampling. beta grows linearly from `beta_start` to 1 
+# over `beta_steps` sampled batches (Schaul et al., Prioritized Experience Replay, 2016). 
+class PrioritizedReplayMemory(ReplayMemory):
+    def __init__(self, capacity, state_size, dtype=torch.float32, generator=None, alpha=0.6, beta_start=0.4, \
+                 beta_steps=100000, eps=1e-3):
+        super().__init__(capacity, state_size, dtype, generator)
+        self.priorities = SumTree(capacity)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_steps = beta_steps
+        self.eps = eps
+        self.max_priority = 1.0
+        self.num_sampled = 0  # batches sampled so far, for annealing beta
+
+    def push(self, state, action, next_state, reward):
+        i = self.cursor
+        super().push(state, action, next_state, reward)
+        self.priorities.update([i], [self.max_priority ** self.alpha])
+
+    # Stratified proportional sampling: the total priority is cut into `batch_size` equal segments and 
+    # one transition is drawn from each 
+    def sample(self, batch_size):
+        total = self.priorities.total()
+        offsets = torch.rand(batch_size, generator=self.generator, dtype=torch.float64).numpy()
+        values = (np.arange(batch_size) + offsets) * (total / batch_size)
+        # guard against rounding past the filled slots, whose priority is 0 
+        indices = np.minimum(self.priorities.find(values), self.size - 1)
+
+        beta = min(1.0, self.beta_start + (1 - self.beta_start) * self.num_sampled / self.beta_steps)
+        self.num_sampled += 1
+        probs = self.priorities.get(indices) / total
+        weights = (self.size * probs) ** -beta
+        weights = torch.from_numpy(weights / weights.max()).float()
+
+        idx = torch.from_numpy(indices)
+        return Batch(self.states[idx], self.actions[idx], self.next_states[idx], self.rewards[idx], \
+                     self.non_final[idx], weights, indices)
+
+    def update_priorities(self, indices, td_errors):  # td_errors: tensor of the batch's TD errors
+        priorities = td_errors.detach().abs().double().numpy() + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.priorities.update(indices, priorities ** self.alpha)
+
+    def snapshot(self, num_tiles=None):
+        snapshot = super().snapshot(num_tiles)
+        snapshot["priorities"] = torch.from_numpy(self.priorities.get(np.arange(self.size)))
+        snapshot["max_priority"] = self.max_priority
+        snapshot["num_sampled"] = self.num_sampled
+        return snapshot
+
+    def load_snapshot(self, snapshot):
+        super().load_snapshot(snapshot)
+        self.priorities = SumTree(self.capacity)
+        if "priorities" in snapshot:
+            self.priorities.update(np.arange(self.size), snapshot["priorities"].numpy())
+            self.max_priority = snapshot["max_priority"]
+            self.num_sampled = snapshot["num_sampled"]
+        elif self.size > 0:  # snapshot of a uniform memory: every transition starts at the top priority
+            self.priorities.update(np.arange(self.size), np.full(self.size, self.max_priority ** self.alpha))
 
 class QNetwork(nn.Module):
     def __init__(self, state_size, action_size, hidden_size=64):
@@ -42,16 +320,155 @@ class QNetwork(nn.Module):
         x = F.relu6(self.fc2(x))
         return self.fc3(x)
 
+# (B, num_cells) row indices into `weight` -> (B, out_features) sums of the indexed rows. The forward pass 
+# is one embedding bag. Its weight gradient is the transposed one-hot of the indices times the output 
+# gradient, computed as that matmul: on CPU this is several times faster than embedding_bag's own 
+# scatter-add backward, which adds up num_cells rows per sample one by one 
+class _OneHotMatmul(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, indices, weight):
+        ctx.save_for_backward(indices)
+        ctx.num_rows = weight.shape[0]
+        return F.embedding_bag(indices, weight, mode='sum')
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        indices, = ctx.saved_tensors
+        one_hot = torch.zeros(indices.shape[0], ctx.num_rows, dtype=grad_output.dtype).scatter_(1, indices, 1.0)
+        return None, one_hot.t() @ grad_output
+
+# nn.Linear(num_cells * num_tiles, out_features) applied to the one-hot encoding of (B, num_cells) tile 
+# indices, computed from the indices themselves: each cell's tile picks one row of `weight` (the 
+# corresponding column of the dense layer's weight) and the rows are summed, num_tiles times fewer 
+# multiply-adds than the dense layer and no one-hot features (see _OneHotMatmul). Starts from the weights 
+# of the nn.Linear `dense` if given (a new one otherwise), and loads a dense layer's weight from state dicts 
+# by transposing it 
+class OneHotLinear(nn.Module):
+    def __init__(self, num_cells, num_tiles, out_features, dense=None):
+        super(OneHotLinear, self).__init__()
+        if dense is None:
+            dense = nn.Linear(num_cells * num_tiles, out_features)
+        self.weight = nn.Parameter(dense.weight.detach().t().contiguous())  # row cell * num_tiles + tile
+        self.bias = nn.Parameter(dense.bias.detach().clone())
+        self.register_buffer('offsets', torch.arange(num_cells) * num_tiles, persistent=False)
+
+    def forward(self, tiles):
+        return _OneHotMatmul.apply(tiles.long() + self.offsets, self.weight) + self.bias
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        weight = state_dict.get(prefix + 'weight')
+        if weight is not None and weight.shape == self.weight.shape[::-1]:  # (out, in) weight of a dense layer
+            state_dict[prefix + 'weight'] = weight.t()
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+# QNetwork on (B, num_cells) tile indices instead of their one-hot encodings, with OneHotLinear as fc1. 
+# Computes what QNetwork computes on the one-hot states, loads QNetwork state dicts, and starts from the 
+# weights a QNetwork would start from with the same random state 
+class EmbeddingQNetwork(QNetwork):
+    def __init__(self, num_cells, num_tiles, action_size, hidden_size=64):
+        super(EmbeddingQNetwork, self).__init__(num_cells * num_tiles, action_size, hidden_size)
+        self.fc1 = OneHotLinear(num_cells, num_tiles, hidden_size, dense=self.fc1)
+
+# Greedy action of each state in the batch 
+def greedy_actions(net, states):
+    return net(states).max(1).indices
+
+
+# Huber loss between Q(state, action) and the one-step TD target from the target network, weighted per 
+# transition by `weights` if given (importance-sampling weights of prioritized replay). Also returns the 
+# TD errors, which prioritized replay uses as the new priorities 
+def td_loss(policy_net, target_net, state, action, next_state, reward, non_final, gamma, weights=None):
+    state_action_values = policy_net(state).gather(1, action)
+    with torch.no_grad():
+        # final states (after which simulation ended) are worth nothing 
+        next_state_values = target_net(next_state).max(1).values * non_final
+    # Compute the expected Q values
+    expected_state_action_values = (next_state_values * gamma) + reward
+
+    losses = F.smooth_l1_loss(state_action_values, expected_state_action_values.unsqueeze(1), reduction='none')
+    if weights is not None:
+        losses = losses * weights.unsqueeze(1)
+    td_errors = (expected_state_action_values - state_action_values.squeeze(1)).detach()
+    return losses.mean(), td_errors
+
+
+# torch.compile `fn`, falling back to eager `fn` for good if compilation is unavailable or fails. 
+# Compiling covers the forward passes and, through AOTAutograd, the backward pass of the loss. 
+def compile_or_eager(fn):
+    if not hasattr(torch, 'compile'):
+        sys.stderr.write('WARNING: torch.compile is unavailable, running in eager mode\n')
+        return fn
+
+    current = [torch.compile(fn)]
+    def call(*args):
+        if current[0] is fn:
+            return fn(*args)
+        try:
+            return current[0](*args)
+        except Exception as e:
+            sys.stderr.write(f'WARNING: torch.compile failed ({type(e).__name__}), running in eager mode\n')
+            current[0] = fn
+            return fn(*args)
+    return call
+
+
 class QAgent:
     def __init__(self, state_size, action_size, action_space, mem_cap=10000, batch_size=128, \
-                 op_lr=0.01, epsilon=0.05, gamma=0.95, weight_update_rate=0.05):
+                 op_lr=0.01, epsilon=0.05, gamma=0.95, weight_update_rate=0.05, num_tiles=None, \
+                 compile=False, target_update_every=1, seed=None, memory_path=None, prioritized=False, \
+                 memory=None, embedding=False, keep_memory=False):
         self.device = torch.device("cpu")
-        self.policy_net = QNetwork(state_size, action_size).to(self.device)
-        self.target_net = QNetwork(state_size, action_size).to(self.device)
+
+        # The agent draws from its own generators (exploration from `rng`, replay sampling and batched 
+        # exploration from `generator`, network initialization from `seed`) and never touches the global 
+        # random state, so agents seeded alike act alike, whatever else runs in the process. Without a seed 
+        # they are seeded from the OS 
+        self.rng = random.Random(seed)
+        self.generator = torch.Generator()
+        if seed is None:
+            self.generator.seed()
+        else:
+            self.generator.manual_seed(seed)
+        # With `embedding` (needs `num_tiles`), the networks are EmbeddingQNetworks, which act on and learn 
+        # from the uint8 tile indices directly, never expanding them to one-hot floats 
+        if embedding and num_tiles is None:
+            sys.stderr.write('ERROR: an embedding network needs num_tiles\n')
+            exit(1)
+        self.embedding = embedding
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(self.generator.initial_seed())
+            if embedding:
+                self.policy_net = EmbeddingQNetwork(state_size // num_tiles, num_tiles, action_size).to(self.device)
+                self.target_net = EmbeddingQNetwork(state_size // num_tiles, num_tiles, action_size).to(self.device)
+            else:
+                self.policy_net = QNetwork(state_size, action_size).to(self.device)
+                self.target_net = QNetwork(state_size, action_size).to(self.device)
         self.target_net.load_state_dict(self.policy_net.state_dict())
 
         self.optimizer = optim.AdamW(self.policy_net.parameters(), lr=op_lr, amsgrad=True)   
-        self.memory = ReplayMemory(mem_cap)
+        # With `num_tiles`, states are one-hot encodings of state_size // num_tiles tile indices, and 
+        # replay memory stores the uint8 tile indices instead (num_tiles times fewer elements, 4 bytes 
+        # less each), expanding them to one-hot floats only for sampled batches 
+        # With a `memory_path`, replay memory is memory-mapped from files in that directory, see 
+        # MemmapReplayMemory, and with `keep_memory` it starts with the transitions found there. With 
+        # `prioritized`, transitions are replayed by TD error, see PrioritizedReplayMemory (kept in RAM, it does 
+        # not combine with `memory_path`). A `memory` given (e.g. a SharedReplayMemory) is used as is, sampled 
+        # with the agent's generator 
+        self.num_tiles = num_tiles
+        memory_size, memory_dtype = state_size, torch.float32
+        if num_tiles is not None:
+            memory_size, memory_dtype = state_size // num_tiles, torch.uint8
+            self.tile_onehot = torch.eye(num_tiles, device=self.device)
+        if memory is not None:
+            self.memory = memory
+            self.memory.generator = self.generator
+        elif prioritized:
+            self.memory = PrioritizedReplayMemory(mem_cap, memory_size, dtype=memory_dtype, generator=self.generator)
+        elif memory_path is None:
+            self.memory = ReplayMemory(mem_cap, memory_size, dtype=memory_dtype, generator=self.generator)
+        else:
+            self.memory = MemmapReplayMemory(memory_path, mem_cap, memory_size, dtype=memory_dtype, \
+                                             generator=self.generator, keep=keep_memory)
         self.batch_size = batch_size 
 
         self.action_space = action_space 
@@ -59,43 +476,100 @@ class QAgent:
         self.gamma = gamma 
         self.wupdate_rate = weight_update_rate
 
+        # Soft target updates may be applied only every `target_update_every` calls, with the rate 
+        # compounded so that the target still keeps (1 - weight_update_rate) ** k of itself over k calls 
+        self.target_update_every = target_update_every
+        self.target_update_rate = 1 - (1 - weight_update_rate) ** target_update_every
+        self.target_update_calls = 0
+        self.target_params = list(self.target_net.parameters())
+        self.policy_params = list(self.policy_net.parameters())
+
         self.steps_done = 0
+
+        # Opt-in compiled policy inference and training step, see compile_or_eager() 
+        self.greedy_actions = greedy_actions
+        self.td_loss = td_loss
+        if compile:
+            self.greedy_actions = compile_or_eager(greedy_actions)
+            self.td_loss = compile_or_eager(td_loss)
     
     def select_action(self, state):
-        sample = random.random()
+        sample = self.rng.random()
         self.steps_done += 1
         if sample > self.epsilon :
             with torch.no_grad():
-                return self.policy_net(state).max(1).indices.view(1, 1)
+                return self.greedy_actions(self.policy_net, state).view(1, 1)
         else:
-            return torch.tensor([[random.choice(self.action_space).value]], device=self.device, dtype=torch.long)
+            return torch.tensor([[self.rng.choice(self.action_space).value]], device=self.device, dtype=torch.long)
+
+    # select_action() for a (B, N) batch of states, e.g. one per board of a VecBoard: a (B, 1) tensor of 
+    # action values from one forward pass, each exploring with probability epsilon as select_action() does. 
+    # Counts B steps. Exploration draws from `generator` here, not `rng`, so it stays vectorized 
+    def select_actions(self, states):
+        num_states = states.shape[0]
+        self.steps_done += num_states
+        with torch.no_grad():
+            actions = self.greedy_actions(self.policy_net, states)
+        explore = torch.rand(num_states, generator=self.generator) <= self.epsilon
+        if explore.any():
+            action_values = torch.tensor([action.value for action in self.action_space], device=self.device)
+            random_actions = action_values[torch.randint(len(self.action_space), (num_states,), \
+                                                         generator=self.generator)]
+            actions = torch.where(explore, random_actions, actions)
+        return actions.view(num_states, 1)
+
+    # Everything the agent learned and will draw from, for checkpoints: networks, optimizer, replay memory 
+    # (see ReplayMemory.snapshot() for `num_tiles`), exploration and generator states 
+    def state_dict(self, num_tiles=None):
+        return {
+            "policy_net": self.policy_net.state_dict(),
+            "target_net": self.target_net.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "memory": self.memory.snapshot(num_tiles),
+            "epsilon": self.epsilon,
+            "steps_done": self.steps_done,
+            "target_update_calls": self.target_update_calls,
+            "rng": self.rng.getstate(),
+            "generator": self.generator.get_state()
+        }
+
+    # Also loads the state of an agent with a dense QNetwork into an embedding agent (see OneHotLinear) 
+    def load_state_dict(self, state):
+        self.policy_net.load_state_dict(state["policy_net"])
+        self.target_net.load_state_dict(state["target_net"])
+        optimizer_state = state["optimizer"]
+        if self.embedding:  # AdamW's moments of a dense fc1 weight are transposed like the weight itself
+            param_states = dict()
+            for i, param_state in optimizer_state["state"].items():
+                shape = self.policy_params[i].shape
+                param_states[i] = {key: value.t() if torch.is_tensor(value) and value.dim() == 2 and \
+                                                     value.shape != shape else value \
+                                   for key, value in param_state.items()}
+            optimizer_state = dict(optimizer_state, state=param_states)
+        self.optimizer.load_state_dict(optimizer_state)
+        self.memory.load_snapshot(state["memory"])
+        self.epsilon = state["epsilon"]
+        self.steps_done = state["steps_done"]
+        self.target_update_calls = state["target_update_calls"]
+        self.rng.setstate(state["rng"])
+        self.generator.set_state(state["generator"])
+
+    def __expand(self, tiles):  # (B, cells) uint8 tile indices -> (B, cells * num_tiles) one-hot floats
+        return self.tile_onehot[tiles.long()].view(tiles.shape[0], -1)
 
     def optimize_model(self):
         if len(self.memory) < self.batch_size:
             return
-        transitions = self.memory.sample(self.batch_size)
-        batch = Transition(*zip(*transitions))
-
-        # Compute a mask of non-final states and concatenate the batch elements
-        # (a final state would've been the one after which simulation ended)
-        non_final_mask = torch.tensor(tuple(map(lambda s: s is not None,
-                                            batch.next_state)), device=self.device, dtype=torch.bool)
-        non_final_next_states = torch.cat([s for s in batch.next_state
-                                                    if s is not None])
-        state_batch = torch.cat(batch.state)
-        action_batch = torch.cat(batch.action)
-        reward_batch = torch.cat(batch.reward)
-
-        state_action_values = self.policy_net(state_batch).gather(1, action_batch)
-        next_state_values = torch.zeros(self.batch_size, device=self.device)
-        with torch.no_grad():
-            next_state_values[non_final_mask] = self.target_net(non_final_next_states).max(1).values
-        # Compute the expected Q values
-        expected_state_action_values = (next_state_values * self.gamma) + reward_batch
+        batch = self.memory.sample(self.batch_size)
+        state_batch, next_state_batch = batch.state, batch.next_state
+        if self.num_tiles is not None and not self.embedding:
+            state_batch, next_state_batch = self.__expand(state_batch), self.__expand(next_state_batch)
 
         # Compute Huber loss
-        criterion = nn.SmoothL1Loss()
-        loss = criterion(state_action_values, expected_state_action_values.unsqueeze(1))
+        loss, td_errors = self.td_loss(self.policy_net, self.target_net, state_batch, batch.action, \
+                                       next_state_batch, batch.reward, batch.non_final, self.gamma, batch.weights)
+        if batch.indices is not None:
+            self.memory.update_priorities(batch.indices, td_errors)
 
         # Optimize the model
         self.optimizer.zero_grad()
@@ -105,11 +579,12 @@ class QAgent:
         self.optimizer.step()
 
     def update_target_weights(self):
-        # Update weights of target network 
-        target_net_state_dict = self.target_net.state_dict()
-        policy_net_state_dict = self.policy_net.state_dict()
-        for key in policy_net_state_dict:
-            target_net_state_dict[key] = policy_net_state_dict[key] * self.wupdate_rate + \
-                                         target_net_state_dict[key] * (1-self.wupdate_rate)
-        self.target_net.load_state_dict(target_net_state_dict)
+        self.target_update_calls += 1
+        if self.target_update_calls % self.target_update_every != 0:
+            return
+
+        # Update weights of target network in place: target += rate * (policy - target), 
+        # as one fused multi-tensor op (QNetwork has no buffers to copy) 
+        with torch.no_grad():
+            torch._foreach_lerp_(self.target_params, self.policy_params, self.target_update_rate)
 
@@ -0,0 +1,53 @@
+import sys
+from board import Board
+from chicken import Action
+from objects import UpdateStatus
+from reward import get_outcome, get_reward
+
+
+# Gym-style wrapper around a single Board: reset() starts an episode on a new board, step() moves the
+# chicken and advances the board, returning (obs, reward, done, info). Rewards and termination are the
+# same as in game.run_agent(): an episode ends only when the chicken wins, dying resets the chicken.
+class CrossyRoadEnv:
+    def __init__(self, mini=False, headless=True):
+        self.mini = mini
+        self.headless = headless
+        self.board = None
+        self.level = None
+
+    # With a seed the board's layout only depends on (level, seed), see layout.generate_layout() 
+    def reset(self, level, seed=None):
+        self.level = level
+        self.board = Board(level, mini=self.mini, headless=self.headless, seed=seed)
+        self.board.update_board()  # need to update board once before we can successfully get the features
+        self.num_timesteps = 0
+        self.died = False  # whether the chicken died at all this episode
+
+        return self.board.extract_features()
+
+    # `action` is an Action or its value
+    def step(self, action):
+        if self.board is None:
+            sys.stderr.write("ERROR: CrossyRoadEnv.step() called before reset()\n")
+            exit(1)
+
+        prev_y = self.board.chicken.y
+        self.board.chicken.move(Action(action))
+        statuses = self.board.update_board()
+
+        outcome = get_outcome(statuses)
+        reward = get_reward(outcome, prev_y, self.board.chicken.y)
+        done = outcome == UpdateStatus.WIN
+        self.num_timesteps += 1
+        self.died = self.died or outcome == UpdateStatus.DEATH
+
+        info = {
+            "statuses": statuses,
+            "outcome": outcome,
+            "died": self.died,
+            "num_timesteps": self.num_timesteps
+        }
+        return self.board.extract_features(), reward, done, info
+
+    def render(self, screen):
+        self.board.draw_screen(screen)
@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+from board import Board
+from chicken import Action
+from objects import UpdateStatus
+from reward import get_outcome, get_reward
+
+# An episode trace holds everything needed to re-simulate one of the agent's episodes, as one JSON line:
+#   {"level": 3, "mini": false, "seed": 1234, "actions": "3330314..."}
+# `seed` is the seed of the board's layout (see layout.generate_layout()) and `actions` holds the Action
+# value of every timestep. A board only depends on its layout and the chicken's moves, so replaying the
+# actions reproduces every reward, death and episode length of the original run without the agent.
+#
+# Usage: python3 episode_trace.py traces/run0.jsonl (add --mini for traces of the mini game)
+
+
+def make_trace(level, mini, seed, actions):
+    return {
+        "level": level,
+        "mini": mini,
+        "seed": seed,
+        "actions": "".join(str(action.value) for action in actions)
+    }
+
+
+def append_trace(path, trace):  # one line per episode, so a run's file grows as it goes
+    with open(path, 'a') as file:
+        file.write(json.dumps(trace) + '\n')
+
+
+def load_traces(path):
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def truncate_traces(path, num_traces):  # keep only the first `num_traces` episodes of a trace file
+    traces = load_traces(path) if os.path.isfile(path) else list()
+    with open(path, 'w') as file:
+        for trace in traces[:num_traces]:
+            file.write(json.dumps(trace) + '\n')
+
+
+# Re-simulate a traced episode headless, as fast as the board steps. Returns what game.run_level()
+# returned for it: whether the chicken died at all, the mean reward and the number of timesteps
+def replay_trace(trace):
+    # the board size is fixed at import time by --mini (see config.py), the seed alone does not fix it 
+    if trace["mini"] != ('--mini' in sys.argv):
+        sys.stderr.write(f'ERROR: trace is of the {"mini" if trace["mini"] else "full"} game, run with' \
+                         f'{"" if trace["mini"] else "out"} --mini\n')
+        exit(1)
+
+    board = Board(trace["level"], mini=trace["mini"], headless=True, seed=trace["seed"])
+    board.update_board()  # as in game.run_level()
+
+    died = False
+    total_reward = 0
+    outcome = None
+    for action in trace["actions"]:
+        prev_y = board.chicken.y
+        board.chicken.move(Action(int(action)))
+        outcome = get_outcome(board.update_board())
+        total_reward += get_reward(outcome, prev_y, board.chicken.y)
+        died = died or outcome == UpdateStatus.DEATH
+
+    if outcome != UpdateStatus.WIN:
+        sys.stderr.write(f'WARNING: replayed level {trace["level"]} episode (seed {trace["seed"]}) did not end ' \
+                         'in a win, the trace does not match the board\n')
+
+    num_timesteps = len(trace["actions"])
+    return died, total_reward / num_timesteps, num_timesteps
+
+
+# Replay a run's trace file into the per-level lists game.run_levels() returned for the run
+def replay_run(path):
+    rewards_by_level = list()
+    episode_lens_by_level = list()
+    num_episodes_by_level = list()
+    levels = list()
+    for trace in load_traces(path):
+        if not levels or levels[-1] != trace["level"]:
+            levels.append(trace["level"])
+            rewards_by_level.append(list())
+            episode_lens_by_level.append(list())
+            num_episodes_by_level.append(0)
+        _, reward, episode_len = replay_trace(trace)
+        rewards_by_level[-1].append(reward)
+        episode_lens_by_level[-1].append(episode_len)
+        num_episodes_by_level[-1] += 1
+
+    return levels, rewards_by_level, episode_lens_by_level, num_episodes_by_level
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1].startswith('--'):
+        sys.stderr.write('ERROR: usage: python3 episode_trace.py TRACE_FILE [--mini]\n')
+        exit(1)
+
+    levels, rewards_by_level, episode_lens_by_level, num_episodes_by_level = replay_run(sys.argv[1])
+    for level, rewards, episode_lens, num_episodes in \
+            zip(levels, rewards_by_level, episode_lens_by_level, num_episodes_by_level):
+        print(f'Level {level}: {num_episodes} episodes, mean episode length ' \
+              f'{sum(episode_lens) / num_episodes:.1f}, mean reward {sum(rewards) / num_episodes:.3f}')
+
+
+if __name__ == '__main__':
+    main()
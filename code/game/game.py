@@ -2,13 +2,20 @@
 import pygame
 import sys
 import time
+import os
+import random
+import multiprocessing
 from chicken import Action
 from config import DISPLAY_WIDTH, DISPLAY_HEIGHT
 from board import Board
-from board import LOOKAHEAD, LOOKBEHIND, LOOKLEFT, LOOKRIGHT, NUMFRAMES
-from objects import UpdateStatus
+from board import STATE_SIZE, one_hot_tiles
 from tile import NUM_TILES
-from level_config import NUM_LEVELS
+from objects import UpdateStatus
+from reward import get_outcome, get_reward
+from level_config import NUM_LEVELS, get_level_schedule
+from layout import generate_layout, load_layout_pool
+from episode_trace import make_trace, append_trace, truncate_traces
+from checkpoint import save_checkpoint, load_checkpoint
 from dqn import QAgent
 import torch
 from plot import plot_results
@@ -16,14 +23,6 @@ from plot import plot_results
 ACTION_SPACE = [Action.STAY, Action.LEFT, Action.RIGHT, Action.UP, Action.DOWN]
 TIMESTEP_LEN = 0  # for easy viewing of agent's actions
 
-# Rewards 
-TIMESTEP_REWARD = 0 # reward earned per timestep 
-DEATH_REWARD = -500 # reward earned if chicken dies 
-TREE_REWARD = 0     # reward earned if chicken runs into tree
-FORWARD_REWARD = 5  # reward earned if chicken moves one step closer to finish line
-BACKWARD_REWARD = -6 # reward earned if chicken moves one step farther from finish line 
-WIN_REWARD = 1000 # reward earned if chicken beats the level 
-
 NUM_CONSECUTIVE_WINS = 5  # number of times agent is required to beat a level IN A ROW before
                           # moving on to the next level 
 NUM_RUNS = 5 # number of trials to average in results
@@ -32,11 +31,14 @@ NUM_RUNS = 5 # number of trials to average in results
 BATCH_SIZE = 128 
 MEM_CAP = 10000
 UPDATE_RATE = 0.05
+TARGET_UPDATE_EVERY = 1  # apply the soft target update every k steps (with a compounded rate)
 EPSILON_HI = 0.2
 EPSILON_LO = 0
 GAMMA = 0.95
 OPTIMIZE_RATE = 1e-4
 
+CHECKPOINT_EVERY = 10  # number of episodes between checkpoints (one is also saved after every level)
+
 
 # Run one iteration, assuming the user is playing the game 
 def run_play(board, level, screen):
@@ -87,13 +89,28 @@ def run_play(board, level, screen):
     return won, died
 
 
+# Observation of `board` as (one-hot features the agent acts on, what the agent's replay memory 
+# stores): the features themselves, or the uint8 tile window if the agent's memory is compact. An 
+# embedding agent acts on the tile window too 
+def observe(board, agent):
+    window = board.extract_tile_window()
+    if agent.embedding:
+        tiles = torch.tensor(window).view(1, -1)  # copy, the window is reused by the board
+        return tiles, tiles
+    # features are written straight into the float32 tensor handed to the agent 
+    state_tensor = one_hot_tiles(window, out=torch.empty(1, STATE_SIZE))
+    if agent.num_tiles is None:
+        return state_tensor, state_tensor
+    return state_tensor, torch.tensor(window).view(1, -1)  # copy, the window is reused by the board
+
+
 # Run one iteration, assuming agent is playing the game
-def run_agent(board, level, screen, agent):
+# `schedule` says when to optimize, see level_config.DEFAULT_SCHEDULE. The board is only drawn if `render` 
+def run_agent(board, level, screen, agent, schedule, render=True):
     won = False
     died = False
 
-    features = board.extract_features()
-    state_tensor = torch.tensor(features).float().unsqueeze(0)
+    state_tensor, stored_state = observe(board, agent)
     time.sleep(TIMESTEP_LEN)
 
     # pick action 
@@ -109,48 +126,43 @@ def run_agent(board, level, screen, agent):
     statuses = board.update_board()
 
     # Extract reward and update Q
-    reward = TIMESTEP_REWARD
-    if UpdateStatus.DEATH in statuses:
-        reward = DEATH_REWARD
+    outcome = get_outcome(statuses)
+    reward = get_reward(outcome, prev_y, board.chicken.y)
+    if outcome == UpdateStatus.DEATH:
         died = True
         agent.epsilon = EPSILON_HI # turn on exploration if agent dies at all
-    elif UpdateStatus.NO_MOVEMENT in statuses:
-        reward = TREE_REWARD 
-    elif UpdateStatus.WIN in statuses:
-        reward = WIN_REWARD
+    elif outcome == UpdateStatus.WIN:
         won = True
         agent.epsilon = EPSILON_LO # turn off exploration if agent wins 
         print("Congratulations! You beat level " + str(level) + "!")
 
-    # Encourage moving forward 
-    if board.chicken.y < prev_y:
-        reward += FORWARD_REWARD 
-    if board.chicken.y > prev_y:
-        reward += BACKWARD_REWARD 
-
-    next_features = board.extract_features()
+    _, stored_next_state = observe(board, agent)
     
     # Convert to tensors
     reward_tensor = torch.tensor([reward], dtype=torch.float)
-    next_state_tensor = torch.from_numpy(next_features).float().unsqueeze(0)
 
     # Store this transition in memory 
-    agent.memory.push(state_tensor, action_tensor, next_state_tensor, reward_tensor)
+    agent.memory.push(stored_state, action_tensor, stored_next_state, reward_tensor)
 
-    # Optimize 
-    agent.optimize_model()
+    # Optimize on the level's schedule 
+    if agent.steps_done >= schedule["learning_starts"] and agent.steps_done % schedule["train_every"] == 0:
+        for _ in range(schedule["grad_steps"]):
+            agent.optimize_model()
 
-    # Update weights of target network 
-    agent.update_target_weights()
+            # Update weights of target network 
+            agent.update_target_weights()
 
     # Sets display to painted screen
-    board.draw_screen(screen)
-    return won, died, reward
+    if render:
+        board.draw_screen(screen)
+    return won, died, reward, Action(direction)
 
 
-# Run level
-def run_level(level, screen, agent, mini):
-    board = Board(level=level, mini=mini)
+# Run level, drawing the agent's board every `render_every` time steps. The agent's actions are 
+# appended to `actions` if given 
+def run_level(level, screen, agent, mini, headless=False, layout=None, render_every=1, actions=None):
+    board = Board(level=level, mini=mini, headless=headless, layout=layout)
+    schedule = get_level_schedule(level)
     board.draw_screen(screen)
 
     won = False
@@ -164,8 +176,11 @@ def run_level(level, screen, agent, mini):
         if agent is None:
             won, _died = run_play(board, level, screen)
         else:
-            won, _died, reward = run_agent(board, level, screen, agent)
+            won, _died, reward, action = run_agent(board, level, screen, agent, schedule, \
+                                                   render=(num_timesteps + 1) % render_every == 0)
             total_reward += reward 
+            if actions is not None:
+                actions.append(action)
         num_timesteps += 1
 
         died = died or _died
@@ -175,32 +190,64 @@ def run_level(level, screen, agent, mini):
     return died, mean_reward, num_timesteps 
 
 # run a range of levels 
-def run_levels(levels, play, mini):
-    pygame.init()
-
-    screen = pygame.display.set_mode([DISPLAY_WIDTH, DISPLAY_HEIGHT])
-    pygame.display.set_caption('Crossy Road')
+# `agent_options` holds extra keyword arguments for QAgent. With a `layout_pool_size`, every episode 
+# is played on a layout drawn from the level's cached pool of that many layouts (see layout.py). 
+# `seed` seeds the agent and the layout of every episode, so runs with the same seed are the same. With a 
+# `trace_path`, every agent episode is appended to that file as an episode trace (see episode_trace.py). 
+# With a `checkpoint_path`, the run is saved there periodically (see checkpoint.py) and, if `resume`, 
+# continues from the checkpoint found there, keeping the transitions of a memory-mapped replay memory. An 
+# `agent` given plays instead of a new QAgent (see pipeline.py) 
+def run_levels(levels, play, mini, headless=False, agent_options=None, layout_pool_size=0, render_every=1, \
+               seed=None, trace_path=None, checkpoint_path=None, resume=False, agent=None):
+    rng = random.Random(seed)
+
+    # headless runs never initialize pygame or open a window 
+    screen = None
+    if not headless:
+        pygame.init()
+
+        screen = pygame.display.set_mode([DISPLAY_WIDTH, DISPLAY_HEIGHT])
+        pygame.display.set_caption('Crossy Road')
 
     # initialize agent 
-    state_size = NUMFRAMES * (LOOKAHEAD + LOOKBEHIND + 1) * (LOOKLEFT + LOOKRIGHT + 1) * NUM_TILES 
+    state_size = STATE_SIZE 
     action_size = len(ACTION_SPACE)
-    agent = None 
-    if not play:
-        agent = QAgent(state_size, action_size, ACTION_SPACE, mem_cap=MEM_CAP, batch_size=BATCH_SIZE, \
-                       op_lr=OPTIMIZE_RATE, epsilon=EPSILON_HI, gamma=GAMMA, weight_update_rate=UPDATE_RATE)
+    if not play and agent is None:
+        options = {"mem_cap": MEM_CAP}
+        options.update(agent_options or dict())
+        agent = QAgent(state_size, action_size, ACTION_SPACE, batch_size=BATCH_SIZE, \
+                       op_lr=OPTIMIZE_RATE, epsilon=EPSILON_HI, gamma=GAMMA, weight_update_rate=UPDATE_RATE, \
+                       target_update_every=TARGET_UPDATE_EVERY, seed=rng.randrange(2 ** 32), keep_memory=resume, \
+                       **options)
 
     rewards_by_level = list()
     episode_lens_by_level = list()
     num_episodes_by_level = list()
-    for level in levels:
-        rewards = list()
-        episode_lens = list()
-        num_episodes = 0
+    level_progress = None  # rewards, episode lengths, episodes and consecutive wins so far in the current level
+    if resume and checkpoint_path is not None and os.path.isfile(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path, levels, mini)
+        agent.load_state_dict(checkpoint["agent"])
+        rng.setstate(checkpoint["rng"])
+        rewards_by_level, episode_lens_by_level, num_episodes_by_level = checkpoint["results"]
+        level_progress = checkpoint["level_progress"]
+        num_done = sum(num_episodes_by_level) + (level_progress[2] if level_progress else 0)
+        print(f"Resuming from {checkpoint_path} after {num_done} episodes")
+        if trace_path is not None:
+            truncate_traces(trace_path, num_done)  # drop episodes played after the checkpoint was saved 
+
+    for level in levels[len(rewards_by_level):]:
+        pool = load_layout_pool(level, mini, layout_pool_size) if layout_pool_size else None
         # Only allowed to proceed to the next level after winning 
         # NUM_CONSECUTIVE_WINS games without dying at all 
-        num_consecutive_wins = 0
+        rewards, episode_lens, num_episodes, num_consecutive_wins = level_progress or (list(), list(), 0, 0)
+        level_progress = None
         while num_consecutive_wins < NUM_CONSECUTIVE_WINS - 1:
-            died, reward, episode_len = run_level(level, screen, agent, mini)
+            layout = rng.choice(pool) if pool else generate_layout(level, mini, rng.randrange(2 ** 32))
+            actions = list() if trace_path and not play else None
+            died, reward, episode_len = run_level(level, screen, agent, mini, headless, layout, render_every, \
+                                                  actions)
+            if actions is not None:
+                append_trace(trace_path, make_trace(level, mini, layout["seed"], actions))
             if died:
                 num_consecutive_wins = 0
             else:
@@ -209,25 +256,68 @@ def run_levels(levels, play, mini):
             episode_lens.append(episode_len)
             num_episodes += 1
 
+            if checkpoint_path is not None and num_episodes % CHECKPOINT_EVERY == 0:
+                save_checkpoint(checkpoint_path, agent, rng, levels, mini, \
+                                (rewards_by_level, episode_lens_by_level, num_episodes_by_level), \
+                                (rewards, episode_lens, num_episodes, num_consecutive_wins))
+
         rewards_by_level.append(rewards)
         episode_lens_by_level.append(episode_lens)
         num_episodes_by_level.append(num_episodes)
+        if checkpoint_path is not None:
+            save_checkpoint(checkpoint_path, agent, rng, levels, mini, \
+                            (rewards_by_level, episode_lens_by_level, num_episodes_by_level), None)
     
-    pygame.quit()
+    if not headless:
+        pygame.quit()
 
     return rewards_by_level, episode_lens_by_level, num_episodes_by_level
 
 
+# Run one independent trial in a worker process, always headless 
+def run_trial(levels, mini, seed, agent_options=None, layout_pool_size=0, trace_path=None, checkpoint_path=None, \
+              resume=False):
+    torch.set_num_threads(1)  # one process per core, don't oversubscribe with intra-op threads
+
+    return run_levels(levels, False, mini, headless=True, agent_options=agent_options, \
+                      layout_pool_size=layout_pool_size, seed=seed, trace_path=trace_path, \
+                      checkpoint_path=checkpoint_path, resume=resume)
+
+
 # Main Script
 # Usage if you want agent to play: python3 game.py 
 # Usage if you want to play: python3 game.py --play
 # Usage if you want to play an easier version: python3 game.py --mini
 # Usage if you want to stop at level 4: python3 game.py --num_levels 4
 # Usage if you do NOT want curriculum learning: python3 game.py --no_curriculum
+# Usage if you want to train without rendering anything: python3 game.py --headless
+# Usage if you want to run the trials in 5 parallel processes: python3 game.py --workers 5
+# Usage if you want replay memory to store compact tile indices: python3 game.py --compact_replay
+# Usage if you want the network compiled with torch.compile: python3 game.py --compile
+# Usage if you want episodes drawn from a cached pool of 1000 layouts per level: python3 game.py --layout_pool 1000
+# Usage if you want to watch the agent but only draw every 10th time step: python3 game.py --render_every 10
+# Usage if you want reproducible runs: python3 game.py --seed 42
+# Usage if you want every episode recorded for replay in traces/run<i>.jsonl: python3 game.py --trace traces
+# Usage if you want each run checkpointed to checkpoints/run<i>.pt: python3 game.py --checkpoint checkpoints
+# Usage if you want to continue the runs checkpointed there: python3 game.py --checkpoint checkpoints --resume
+# Usage if you want a replay memory of 2000000 transitions: python3 game.py --mem_cap 2000000
+# Usage if you want each run's replay memory memory-mapped from replay/run<i>: python3 game.py --replay_dir replay
+# Usage if you want transitions replayed in proportion to their TD error: python3 game.py --prioritized
+# Usage if you want the network to read tile indices instead of one-hot features: python3 game.py --embedding
 def main():
     mini = False 
     play = False
     curriculum = True
+    headless = False
+    num_workers = 1
+    agent_options = dict()
+    layout_pool_size = 0
+    render_every = 1
+    seed = None
+    trace_dir = None
+    checkpoint_dir = None
+    resume = False
+    replay_dir = None
     # command line option for having user play the game instead of agent
     if '--play' in sys.argv:
         play = True 
@@ -248,19 +338,149 @@ def main():
     # command line option for ditching curriculum learning (begin at last level)
     if '--no_curriculum' in sys.argv:
         curriculum = False
+    # command line option for training without pygame (no window, no drawing)
+    if '--headless' in sys.argv:
+        headless = True
+        if play:
+            sys.stderr.write('--headless cannot be combined with --play\n')
+            exit(1)
+    # command line option for running each trial in its own (headless) worker process 
+    if '--workers' in sys.argv:
+        flag_idx = sys.argv.index('--workers')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--workers needs to be followed by a number\n')
+            exit(1)
+        num_workers = int(sys.argv[flag_idx + 1])
+        if num_workers < 1:
+            sys.stderr.write('--workers needs to be at least 1\n')
+            exit(1)
+        if play:
+            sys.stderr.write('--workers cannot be combined with --play\n')
+            exit(1)
+    # command line option for storing uint8 tile indices instead of one-hot features in replay memory 
+    if '--compact_replay' in sys.argv:
+        agent_options["num_tiles"] = NUM_TILES
+    # command line option for compiling policy inference and the training step (falls back to eager) 
+    if '--compile' in sys.argv:
+        agent_options["compile"] = True
+    # command line option for drawing each episode's board from a cached pool of pre-generated layouts 
+    if '--layout_pool' in sys.argv:
+        flag_idx = sys.argv.index('--layout_pool')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--layout_pool needs to be followed by a number\n')
+            exit(1)
+        layout_pool_size = int(sys.argv[flag_idx + 1])
+    # command line option for drawing the agent's board only every N time steps 
+    if '--render_every' in sys.argv:
+        flag_idx = sys.argv.index('--render_every')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--render_every needs to be followed by a number\n')
+            exit(1)
+        render_every = int(sys.argv[flag_idx + 1])
+        if render_every < 1:
+            sys.stderr.write('--render_every needs to be at least 1\n')
+            exit(1)
+    # command line option for seeding the runs (agents and boards), making them reproducible 
+    if '--seed' in sys.argv:
+        flag_idx = sys.argv.index('--seed')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--seed needs to be followed by a number\n')
+            exit(1)
+        seed = int(sys.argv[flag_idx + 1])
+    # command line option for recording each run's episodes to a trace file in a directory 
+    if '--trace' in sys.argv:
+        flag_idx = sys.argv.index('--trace')
+        if flag_idx == len(sys.argv) - 1 or sys.argv[flag_idx + 1].startswith('--'):
+            sys.stderr.write('--trace needs to be followed by a directory\n')
+            exit(1)
+        trace_dir = sys.argv[flag_idx + 1]
+        if play:
+            sys.stderr.write('--trace cannot be combined with --play\n')
+            exit(1)
+    # command line option for periodically saving each run's full training state to a directory 
+    if '--checkpoint' in sys.argv:
+        flag_idx = sys.argv.index('--checkpoint')
+        if flag_idx == len(sys.argv) - 1 or sys.argv[flag_idx + 1].startswith('--'):
+            sys.stderr.write('--checkpoint needs to be followed by a directory\n')
+            exit(1)
+        checkpoint_dir = sys.argv[flag_idx + 1]
+        if play:
+            sys.stderr.write('--checkpoint cannot be combined with --play\n')
+            exit(1)
+    # command line option for continuing the runs from their checkpoints (use the same options as before) 
+    if '--resume' in sys.argv:
+        resume = True
+        if checkpoint_dir is None:
+            sys.stderr.write('--resume needs --checkpoint followed by the checkpoint directory\n')
+            exit(1)
+    # command line option for the number of transitions replay memory holds 
+    if '--mem_cap' in sys.argv:
+        flag_idx = sys.argv.index('--mem_cap')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--mem_cap needs to be followed by a number\n')
+            exit(1)
+        agent_options["mem_cap"] = int(sys.argv[flag_idx + 1])
+    # command line option for keeping replay memory in memory-mapped files instead of RAM 
+    if '--replay_dir' in sys.argv:
+        flag_idx = sys.argv.index('--replay_dir')
+        if flag_idx == len(sys.argv) - 1 or sys.argv[flag_idx + 1].startswith('--'):
+            sys.stderr.write('--replay_dir needs to be followed by a directory\n')
+            exit(1)
+        replay_dir = sys.argv[flag_idx + 1]
+    # command line option for prioritized experience replay (sampling by TD error instead of uniformly) 
+    if '--prioritized' in sys.argv:
+        agent_options["prioritized"] = True
+        if replay_dir is not None:
+            sys.stderr.write('--prioritized cannot be combined with --replay_dir\n')
+            exit(1)
+    # command line option for an embedding-bag first layer on tile indices (implies --compact_replay) 
+    if '--embedding' in sys.argv:
+        agent_options["embedding"] = True
+        agent_options["num_tiles"] = NUM_TILES
 
     rewards_by_run = list()
     episode_lens_by_run = list()
     num_episodes_by_run = list()
     start_level = 1 if curriculum else num_levels
     num_runs = 1 if play else NUM_RUNS 
-    for i in range(num_runs):
-        print(f"Beginning Run {i + 1}")
-        rewards, episode_lens, num_episodes = \
-            run_levels(range(start_level, num_levels + 1), play, mini)
-        rewards_by_run.append(rewards)
-        episode_lens_by_run.append(episode_lens)
-        num_episodes_by_run.append(num_episodes)
+    levels = range(start_level, num_levels + 1)
+    # every run gets its own seed, derived from --seed if given 
+    seed_rng = random.Random(seed)
+    seeds = [seed_rng.randrange(2 ** 32) for _ in range(num_runs)]
+    trace_paths = [None] * num_runs
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+        trace_paths = [os.path.join(trace_dir, f'run{i}.jsonl') for i in range(num_runs)]
+        if not resume:
+            for trace_path in trace_paths:
+                open(trace_path, 'w').close()  # traces are appended episode by episode, start from an empty file
+    checkpoint_paths = [None] * num_runs
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint_paths = [os.path.join(checkpoint_dir, f'run{i}.pt') for i in range(num_runs)]
+    agent_options_by_run = [agent_options] * num_runs
+    if replay_dir is not None:
+        agent_options_by_run = [dict(agent_options, memory_path=os.path.join(replay_dir, f'run{i}')) \
+                                for i in range(num_runs)]
+    if num_workers > 1:
+        print(f"Beginning {num_runs} Runs on {num_workers} workers")
+        # spawn, not fork: forking a process that has already initialized torch is unsafe 
+        with multiprocessing.get_context('spawn').Pool(num_workers) as pool:
+            results = pool.starmap(run_trial, [(levels, mini, seeds[i], agent_options_by_run[i], layout_pool_size, \
+                                                trace_paths[i], checkpoint_paths[i], resume) for i in range(num_runs)])
+        for rewards, episode_lens, num_episodes in results:
+            rewards_by_run.append(rewards)
+            episode_lens_by_run.append(episode_lens)
+            num_episodes_by_run.append(num_episodes)
+    else:
+        for i in range(num_runs):
+            print(f"Beginning Run {i + 1} (seed {seeds[i]})")
+            rewards, episode_lens, num_episodes = run_levels(levels, play, mini, headless, agent_options_by_run[i], \
+                                                             layout_pool_size, render_every, seeds[i], \
+                                                             trace_paths[i], checkpoint_paths[i], resume)
+            rewards_by_run.append(rewards)
+            episode_lens_by_run.append(episode_lens)
+            num_episodes_by_run.append(num_episodes)
 
     if not play:
         if curriculum:
@@ -0,0 +1,174 @@
+import json
+import os
+import random
+import sys
+from config import BOARD_WIDTH, BOARD_HEIGHT
+from terrain import TerrainType
+from objects import CAR_LENGTH, LOG_LENGTH
+from level_config import get_level_config
+
+# A layout is a compact, JSON-serializable description of a board at its start:
+#   {"level": 3, "mini": False, "seed": 7, "width": 20, "height": 20,
+#    "terrain": [TerrainType value of each row],
+#    "objects": [["tree", x, y], ["lilypad", x, y], ["log", start_x, y, vel, mov_rate],
+#                ["car", start_x, y, vel, mov_rate], ["train", y, start_counter], ...]}
+# Every board also has a WinZone on row 0 and a DeathZone, which are not listed.
+# Board(level, layout=layout) builds the board it describes without any random draws.
+
+LAYOUT_CACHE_DIR = 'layouts'
+POOL_SEED_STRIDE = 1000000  # pool layout i of level l is generated from seed l * POOL_SEED_STRIDE + i
+
+
+# Randomly generate a layout following the level's config. With a seed the layout only depends on
+# (level, mini, seed), otherwise it is drawn from the global `random` module
+def generate_layout(level, mini=False, seed=None):
+    rng = random if seed is None else random.Random(seed)
+    config = get_level_config(level, mini)
+    terrain = generate_terrain(config, rng)
+
+    return {
+        "level": level,
+        "mini": mini,
+        "seed": seed,
+        "width": BOARD_WIDTH,
+        "height": BOARD_HEIGHT,
+        "terrain": [ttype.value for ttype in terrain],
+        "objects": generate_objects(config, terrain, rng)
+    }
+
+
+def generate_terrain(config, rng):  # TerrainType of each row
+    terrain = [TerrainType.GRASS] * BOARD_HEIGHT
+    # invariant: top row MUST be FINISH terrain type (to indicate finish line)
+    terrain[0] = TerrainType.FINISH
+
+    num_rivers = rng.choice(config["num_rivers"])
+    num_roads = rng.choice(config["num_roads"])
+    num_trains = rng.choice(config["num_trains"])
+    terrain_ys = rng.sample(range(1, BOARD_HEIGHT - 2), num_rivers + num_roads + num_trains)
+    river_indices = terrain_ys[:num_rivers]
+    road_indices = terrain_ys[num_rivers:num_rivers + num_roads]
+    train_indices = terrain_ys[num_rivers + num_roads:]
+
+    # Disallow two consecutive river indices
+    river_indices.sort()
+    for i in range(1, len(river_indices)):
+        if river_indices[i] - river_indices[i - 1] == 1: # upon discovery of two consecutive rivers, remove
+                                                         # the second one
+            river_indices[i] = -2 # sentinel value for "invalid", in preparation for removal
+    river_indices = list(filter(lambda x : x >= 0, river_indices))
+
+    # Assign to the terrain array
+    for i in road_indices:
+        terrain[i] = TerrainType.ROAD
+
+    for i in river_indices:
+        terrain[i] = TerrainType.RIVER
+
+    for i in train_indices:
+        terrain[i] = TerrainType.TRAIN
+
+    return terrain
+
+
+def generate_objects(config, terrain, rng):  # object descriptions, see the top of this file
+    objects = []
+
+    # Initialize objects based on terrain
+    prev_row_tree_columns = set()
+    prev_row_lily_columns = set()
+
+    for y in range(1, BOARD_HEIGHT - 2):  # Avoiding the first row and last two rows
+        terrain_type = terrain[y]
+        current_row_tree_columns = set()
+        current_row_lily_columns = set()
+
+        if terrain_type == TerrainType.GRASS:
+            if rng.choice([True, False]):  # Randomly decide to put trees or not
+                num_trees = rng.choice(config["num_trees_per_row"])
+
+                for _ in range(num_trees):
+                    # Avoid columns with lily pads in adjacent rows and already placed trees in the same row
+                    available_columns = [x for x in range(BOARD_WIDTH) if
+                                         x not in prev_row_lily_columns and x not in current_row_tree_columns]
+                    if available_columns:
+                        tree_x = rng.choice(available_columns)
+                        objects.append(["tree", tree_x, y])
+                        current_row_tree_columns.add(tree_x)
+
+        elif terrain_type == TerrainType.RIVER:
+            if rng.choice(config["river_is_lilypad"]):  # Randomly decide between lilypad and log
+                num_lilypads = rng.choice(config["num_lilys_per_row"])
+
+                for _ in range(num_lilypads):
+                    # Avoid columns with trees in adjacent rows and already placed lilypads in the same row
+                    available_columns = [x for x in range(BOARD_WIDTH) if
+                                         x not in prev_row_tree_columns and x not in current_row_lily_columns]
+                    if available_columns:
+                        lily_x = rng.choice(available_columns)
+                        objects.append(["lilypad", lily_x, y])
+                        current_row_lily_columns.add(lily_x)
+            else:
+                num_logs_per_row = rng.choice(config["num_logs_per_row"])
+                log_vel = rng.choice(config["log_vels"])
+                log_mov_rate = rng.choice(config["log_mov_rates"])
+                unavailable_log_xs = [] # logic to ensure no two logs are "on top of each other"
+                for _ in range(num_logs_per_row):
+                    log_x = rng.randint(0, BOARD_WIDTH - 1)
+                    while log_x in unavailable_log_xs:
+                        log_x = rng.randint(0, BOARD_WIDTH - 1)
+                    unavailable_log_xs.extend(range(log_x - LOG_LENGTH, log_x + LOG_LENGTH))
+                    objects.append(["log", log_x, y, log_vel, log_mov_rate])
+
+        elif terrain_type == TerrainType.ROAD:
+            num_cars_per_row = rng.choice(config["num_cars_per_row"])
+            car_vel = rng.choice(config["car_vels"])
+            car_mov_rate = rng.choice(config["car_mov_rates"])
+            unavailable_car_xs = [] # logic to ensure no two cars are "on top of each other"
+            for _ in range(num_cars_per_row):
+                x = rng.randint(0, BOARD_WIDTH - 1)
+                while x in unavailable_car_xs:
+                    x = rng.randint(0, BOARD_WIDTH - 1)
+                unavailable_car_xs.extend(range(x - CAR_LENGTH, x + CAR_LENGTH))
+                objects.append(["car", x, y, car_vel, car_mov_rate])
+
+        elif terrain_type == TerrainType.TRAIN:
+            # Initialize train objects
+            objects.append(["train", y, rng.randint(0, 100)])
+
+        prev_row_tree_columns = current_row_tree_columns
+        prev_row_lily_columns = current_row_lily_columns
+
+    return objects
+
+
+def layout_cache_path(level, mini=False):
+    return os.path.join(LAYOUT_CACHE_DIR, f'level{level}_{"mini" if mini else "full"}.json')
+
+
+# Pool of `size` seeded layouts for a level, read from the on-disk cache if it holds enough of them
+# and (re)generated and cached otherwise. Pools are deterministic, so they can pin evaluation sets
+def load_layout_pool(level, mini=False, size=1000):
+    path = layout_cache_path(level, mini)
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            layouts = json.load(file)
+        if len(layouts) >= size and layouts[0]["width"] == BOARD_WIDTH and layouts[0]["height"] == BOARD_HEIGHT:
+            return layouts[:size]
+
+    layouts = [generate_layout(level, mini, seed=level * POOL_SEED_STRIDE + i) for i in range(size)]
+
+    # write to a temporary file first so an interrupted write never leaves a corrupt cache
+    os.makedirs(LAYOUT_CACHE_DIR, exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(layouts, file, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+    return layouts
+
+
+def check_layout(layout):
+    if layout["width"] != BOARD_WIDTH or layout["height"] != BOARD_HEIGHT:
+        sys.stderr.write(f'ERROR: layout is for a {layout["width"]}x{layout["height"]} board, but the board is ' \
+                         f'{BOARD_WIDTH}x{BOARD_HEIGHT} (check --mini)\n')
+        exit(1)
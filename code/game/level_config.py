@@ -31,6 +31,18 @@ MINI_CONFIG = {
     "river_is_lilypad" : [False, True] # whether river holds logs or lilypads 
 }
 
+# How often the agent learns: every `train_every` environment steps it takes `grad_steps` gradient 
+# steps (each followed by a soft target update), once it has taken `learning_starts` steps 
+DEFAULT_SCHEDULE = {
+    "train_every" : 1,
+    "grad_steps" : 1,
+    "learning_starts" : 128 # nothing can be learned before replay memory holds a full batch
+}
+
+# Per-level overrides of DEFAULT_SCHEDULE, e.g. {1 : {"train_every" : 4}} to spend less time on 
+# backprop in the easiest level 
+LEVEL_SCHEDULES = {}
+
 # 1 = no obstacles
 # 2 = trees only 
 # 3 = slow cars only 
@@ -76,3 +88,12 @@ def get_level_config(level, mini=False):
     if level < 14:
         config["num_trains"] = [0]
     return config
+
+def get_level_schedule(level):
+    if level < 1 or level > NUM_LEVELS:
+        sys.stderr.write("IMPOSSIBLE ERROR: Requested level out of range\n")
+        exit(1)
+
+    schedule = dict(DEFAULT_SCHEDULE)
+    schedule.update(LEVEL_SCHEDULES.get(level, dict()))
+    return schedule
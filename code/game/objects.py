@@ -1,8 +1,7 @@
-import pygame
 import sys
+from assets import scaled_image
 from enum import Enum
 from config import DISPLAY_WIDTH, DISPLAY_HEIGHT, TILE_WIDTH, TILE_HEIGHT, BOARD_WIDTH, BOARD_HEIGHT
-from paint import paint_tile_screen
 from tile import Tile
 
 class ObjectType(Enum):
@@ -55,7 +54,7 @@ class WinZone:  # when chicken reaches finish line
         self.y = y
 
     def draw(self, screen):
-        pass
+        return None  # nothing is drawn
 
     def update_env(self, tiles, chicken):
         if chicken.y == self.y:
@@ -65,6 +64,9 @@ class WinZone:  # when chicken reaches finish line
     def reset(self):
         pass
 
+    def seek(self, t):
+        pass
+
 
 # A single death zone object represents the ENTIRE death zone at the
 # bottom of the screen, growing by a certain number of coordinates every 
@@ -75,12 +77,15 @@ class DeathZone:
         self.growth_rate = growth_rate  # number of time steps before death zone grows by one row
         self.counter = growth_rate  # number of time steps UNTIL the next growth
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.DEATHZONE])
-        # will be scaled before drawing because size depends on a variety of factors 
+        # no image is held, because its size depends on how far the death zone has grown; the scaled 
+        # image of each size is cached by scaled_image() 
 
     def draw(self, screen):
-        img = pygame.transform.scale(self.img, (DISPLAY_WIDTH, (BOARD_HEIGHT - self.y) * TILE_HEIGHT))
-        screen.blit(img, (0, self.y * TILE_HEIGHT))
+        if self.y >= BOARD_HEIGHT:  # nothing to draw yet
+            return None
+        img = scaled_image(OBJECT_FILE_PATHS[ObjectType.DEATHZONE], \
+                           (DISPLAY_WIDTH, (BOARD_HEIGHT - self.y) * TILE_HEIGHT))
+        return screen.blit(img, (0, self.y * TILE_HEIGHT))
 
     def update_env(self, tiles, chicken):  # returns an update status
         # Update size of death zone if timestep is multiple of `self.growth_rate`
@@ -91,8 +96,7 @@ class DeathZone:
             self.counter = self.growth_rate
 
         # Update tiles 
-        for i in range(self.y, BOARD_HEIGHT):
-            tiles[:, i] = [Tile.DEATH] * BOARD_WIDTH  
+        tiles[:, self.y:] = Tile.DEATH
 
         if chicken.y >= self.y:  # if chicken is in death zone
             return UpdateStatus.DEATH
@@ -103,33 +107,37 @@ class DeathZone:
         self.y = BOARD_HEIGHT
         self.counter = self.growth_rate
 
+    def seek(self, t):  # state after t updates since the last reset
+        self.y = BOARD_HEIGHT - t // self.growth_rate
+        self.counter = self.growth_rate - t % self.growth_rate
+
 
 class Tree:
-    def __init__(self, x, y):
+    def __init__(self, x, y, headless=False):
         self.x = x
         self.y = y
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.TREE])
-        self.img = pygame.transform.scale(self.img, (TILE_WIDTH, TILE_HEIGHT))
+        self.img = None
+        if not headless:
+            self.img = scaled_image(OBJECT_FILE_PATHS[ObjectType.TREE], (TILE_WIDTH, TILE_HEIGHT))
 
-    def draw(self, screen):
-        screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
+    def draw(self, screen):  # returns the drawn rect
+        return screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
 
-    def update_env(self, tiles, chicken):
-        # A bit redundant, but probably the cleanest given the current framework 
-        tiles[self.x][self.y] = Tile.TREE
-
-        if chicken.x == self.x and chicken.y == self.y:  # if chicken tried to run into a tree
-            chicken.undo_move()
-            return UpdateStatus.NO_MOVEMENT
-        return UpdateStatus.SUCCESS
+    # Trees never move, so the board draws them into its base tiles once and stops the chicken 
+    # from entering their cells itself 
+    def draw_tiles(self, tiles):
+        tiles[self.x, self.y] = Tile.TREE
 
     def reset(self):
         pass
 
+    def seek(self, t):
+        pass
+
 
 class Car:
-    def __init__(self, start_x, y, vel, mov_rate):
+    def __init__(self, start_x, y, vel, mov_rate, headless=False):
         self.start_x = start_x
         self.x1 = start_x
         self.x2 = self.x1 + CAR_LENGTH 
@@ -145,68 +153,72 @@ class Car:
         # A car moving 2 tiles per time step to the left would have vel = -2, mov_rate = 1
         # A car moving 1 tile every 2 time steps to the right would have vel = 1, mov_rate = 2
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.CAR])
-        self.img = pygame.transform.scale(self.img, (TILE_WIDTH * CAR_LENGTH, TILE_HEIGHT))
+        self.img = None
+        if not headless:
+            self.img = scaled_image(OBJECT_FILE_PATHS[ObjectType.CAR], (TILE_WIDTH * CAR_LENGTH, TILE_HEIGHT))
 
-    def draw(self, screen):
-        screen.blit(self.img, (self.x1 * TILE_WIDTH, self.y * TILE_HEIGHT))
+    def draw(self, screen):  # returns the drawn rect
+        return screen.blit(self.img, (self.x1 * TILE_WIDTH, self.y * TILE_HEIGHT))
 
-    def update_env(self, tiles, chicken):
-        # clear car from tiles
-        for i in range(self.x1, self.x2):
-            if 0 <= i < BOARD_WIDTH: # ensure that i is in range
-                tiles[i][self.y] = Tile.ROAD 
-        
-        # move car
+    def move(self):  # advance one time step
         self.mov_counter -= 1
         if self.mov_counter == 0:
-            self.x1 = self.x1 + self.vel
-            self.x2 = self.x1 + CAR_LENGTH 
+            # wrap around if out of bounds, x2 stays in the range 0 to BOARD_WIDTH + CAR_LENGTH - 1 
+            self.x2 = (self.x1 + self.vel + CAR_LENGTH) % (BOARD_WIDTH + CAR_LENGTH)
+            self.x1 = self.x2 - CAR_LENGTH
 
             self.mov_counter = self.mov_rate
 
-        # wrap around if out of bounds 
-        self.x2 = self.x2 % (BOARD_WIDTH + CAR_LENGTH) # clamp to range of 0 to BOARD_WIDTH + LOG_LENGTH - 1
-        self.x1 = self.x2 - CAR_LENGTH
+    def covers(self, x):
+        return self.x1 <= x < self.x2
 
-        # update tiles to reflect car's new position 
-        for i in range(self.x1, self.x2):
-            if 0 <= i < BOARD_WIDTH:
-                tiles[i][self.y] = Tile.CAR
+    def draw_tiles(self, tiles):  # slice clipped to the board
+        tiles[max(self.x1, 0):min(self.x2, BOARD_WIDTH), self.y] = Tile.CAR
 
+    # only called for objects in the chicken's row 
+    def collide(self, chicken):
         # kill chicken if chicken impacts car
-        if chicken.y == self.y and (self.x1 <= chicken.x < self.x2):
+        if self.covers(chicken.x):
             return UpdateStatus.DEATH
 
         return UpdateStatus.SUCCESS
 
     def reset(self):
         self.x1 = self.start_x
+        self.x2 = self.x1 + CAR_LENGTH
+        self.mov_counter = self.mov_rate
+
+    def seek(self, t):  # state after t updates since the last reset, the car has moved t // mov_rate times
+        self.x2 = (self.start_x + CAR_LENGTH + t // self.mov_rate * self.vel) % (BOARD_WIDTH + CAR_LENGTH)
+        self.x1 = self.x2 - CAR_LENGTH
+        self.mov_counter = self.mov_rate - t % self.mov_rate
 
 
 class Lilypad:
-    def __init__(self, x, y):
+    def __init__(self, x, y, headless=False):
         self.x = x
         self.y = y
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.LILYPAD])
-        self.img = pygame.transform.scale(self.img, (TILE_WIDTH, TILE_HEIGHT))
-
-    def draw(self, screen):
-        screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
+        self.img = None
+        if not headless:
+            self.img = scaled_image(OBJECT_FILE_PATHS[ObjectType.LILYPAD], (TILE_WIDTH, TILE_HEIGHT))
 
-    def update_env(self, tiles, chicken):
-        # again, a little needless recomputation but I think cleanest given current framework 
-        tiles[self.x][self.y] = Tile.LILYPAD 
+    def draw(self, screen):  # returns the drawn rect
+        return screen.blit(self.img, (self.x * TILE_WIDTH, self.y * TILE_HEIGHT))
 
-        return UpdateStatus.SUCCESS 
+    # drawn into the board's base tiles once, like Tree 
+    def draw_tiles(self, tiles):
+        tiles[self.x, self.y] = Tile.LILYPAD 
 
     def reset(self):
         pass
 
+    def seek(self, t):
+        pass
+
 
 class Log:
-    def __init__(self, start_x, y, vel, mov_rate):
+    def __init__(self, start_x, y, vel, mov_rate, headless=False):
         self.start_x = start_x
         self.x1 = start_x
         self.x2 = start_x + LOG_LENGTH
@@ -216,59 +228,56 @@ class Log:
         self.mov_rate = mov_rate  # number of time steps per movement
         self.mov_counter = mov_rate 
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.LOG])
-        self.img = pygame.transform.scale(self.img, (TILE_WIDTH * LOG_LENGTH, TILE_HEIGHT))
+        self.img = None
+        if not headless:
+            self.img = scaled_image(OBJECT_FILE_PATHS[ObjectType.LOG], (TILE_WIDTH * LOG_LENGTH, TILE_HEIGHT))
 
-    def draw(self, screen):
-        screen.blit(self.img, (self.x1 * TILE_WIDTH, self.y * TILE_HEIGHT))
+    def draw(self, screen):  # returns the drawn rect
+        return screen.blit(self.img, (self.x1 * TILE_WIDTH, self.y * TILE_HEIGHT))
 
-    def update_env(self, tiles, chicken):
-        # clear log from tiles
-        for i in range(self.x1, self.x2):
-            if 0 <= i < BOARD_WIDTH: # ensure that i is in range
-                tiles[i][self.y] = Tile.WATER 
-        
-        # move log
+    def will_move(self):  # whether the next call to move() moves the log (and anything on it) 
+        return self.mov_counter == 1
+
+    def move(self):  # advance one time step
         self.mov_counter -= 1
         if self.mov_counter == 0:
-            # move chicken if on log 
-            # TODO: fix the bug which the chicken is not on the log but it is still bumped
-            if chicken.y == self.y and (self.x1 <= chicken.x < self.x2):
-                chicken.x += self.vel 
+            # wrap around if out of bounds, x2 stays in the range 0 to BOARD_WIDTH + LOG_LENGTH - 1 
+            self.x2 = (self.x1 + self.vel + LOG_LENGTH) % (BOARD_WIDTH + LOG_LENGTH)
+            self.x1 = self.x2 - LOG_LENGTH 
 
             self.mov_counter = self.mov_rate
-            self.x1 += self.vel
-            self.x2 = self.x1 + LOG_LENGTH
 
-        
-        # wrap around if out of bounds 
-        self.x2 = self.x2 % (BOARD_WIDTH + LOG_LENGTH) # clamp to range of 0 to BOARD_WIDTH + LOG_LENGTH - 1
-        self.x1 = self.x2 - LOG_LENGTH 
-
-        # update tiles to reflect new log position 
-        for i in range(self.x1, self.x2):
-            if 0 <= i < BOARD_WIDTH:
-                tiles[i][self.y] = Tile.LOG 
+    def covers(self, x):
+        return self.x1 <= x < self.x2
 
-        # kill chicken if out of bounds 
-        if chicken.x < 0 or BOARD_WIDTH <= chicken.x: 
-            return UpdateStatus.DEATH 
+    def draw_tiles(self, tiles):  # slice clipped to the board
+        tiles[max(self.x1, 0):min(self.x2, BOARD_WIDTH), self.y] = Tile.LOG
 
+    # only called for objects in the chicken's row. The board carries the chicken along (see 
+    # Board.update_board()) and the river kill catches it if it is in the water 
+    def collide(self, chicken):
         return UpdateStatus.SUCCESS
 
     def reset(self):
         self.x1 = self.start_x
         self.x2 = self.x1 + LOG_LENGTH
+        self.mov_counter = self.mov_rate
+
+    def seek(self, t):  # state after t updates since the last reset, the log has moved t // mov_rate times
+        self.x2 = (self.start_x + LOG_LENGTH + t // self.mov_rate * self.vel) % (BOARD_WIDTH + LOG_LENGTH)
+        self.x1 = self.x2 - LOG_LENGTH
+        self.mov_counter = self.mov_rate - t % self.mov_rate
 
 
 class Train:  # Train will always appear and disappear in the same pattern
-    def __init__(self, y, start_counter):
+    def __init__(self, y, start_counter, headless=False):
         self.y = y 
 
-        self.img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.TRAIN])
-        self.img = pygame.transform.scale(self.img, (DISPLAY_WIDTH, TILE_HEIGHT))
-        self.warn_img = pygame.image.load(OBJECT_FILE_PATHS[ObjectType.TRACKWARNING])
-        self.warn_img = pygame.transform.scale(self.warn_img, (DISPLAY_WIDTH, TILE_HEIGHT))
+        self.img = None
+        self.warn_img = None
+        if not headless:
+            self.img = scaled_image(OBJECT_FILE_PATHS[ObjectType.TRAIN], (DISPLAY_WIDTH, TILE_HEIGHT))
+            self.warn_img = scaled_image(OBJECT_FILE_PATHS[ObjectType.TRACKWARNING], (DISPLAY_WIDTH, TILE_HEIGHT))
 
         self.cycle_len = TRAIN_SAFE_TIME + TRAIN_WARN_TIME + TRAIN_DEATH_TIME 
         self.start_counter = start_counter % self.cycle_len 
@@ -285,18 +294,19 @@ class Train:  # Train will always appear and disappear in the same pattern
 
     def draw(self, screen):
         if self.__is_safe():
-            pass # don't draw anything if track is empty 
+            return None # don't draw anything if track is empty 
         elif self.__is_warn():
-            screen.blit(self.warn_img, (0, self.y * TILE_HEIGHT))
+            return screen.blit(self.warn_img, (0, self.y * TILE_HEIGHT))
         elif self.__is_death():
-            screen.blit(self.img, (0, self.y * TILE_HEIGHT))
+            return screen.blit(self.img, (0, self.y * TILE_HEIGHT))
         else:
             sys.stderr.write("IMPOSSIBLE ERROR: Train is in neither the 'safe', 'warning', nor 'death' state.\n")
             exit(1)
 
-    def update_env(self, tiles, chicken):
+    def move(self):  # advance one time step
         self.counter += 1
 
+    def draw_tiles(self, tiles):
         tile = None 
         if self.__is_safe():
             tile = Tile.TRACK 
@@ -305,14 +315,18 @@ class Train:  # Train will always appear and disappear in the same pattern
         elif self.__is_death():
             tile = Tile.TRAIN 
         
-        for i in range(BOARD_WIDTH):
-            tiles[i][self.y] = tile 
-        
+        tiles[:, self.y] = tile 
+
+    # only called for objects in the chicken's row 
+    def collide(self, chicken):
         # kill chicken if is death 
-        if self.__is_death() and self.y == chicken.y:
+        if self.__is_death():
             return UpdateStatus.DEATH 
         
         return UpdateStatus.SUCCESS 
 
     def reset(self):
         self.counter = self.start_counter
+
+    def seek(self, t):  # state after t updates since the last reset
+        self.counter = self.start_counter + t
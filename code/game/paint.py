@@ -1,6 +1,8 @@
 import pygame
 import sys
 
+GRID_COLORKEY = (255, 0, 255)  # transparent color of the grid overlay, never used by the grid itself
+
 
 def paint_tiles(screen, scr_width, scr_height, tile_width, tile_height):
     if scr_width % tile_width != 0:
@@ -15,25 +17,28 @@ def paint_tiles(screen, scr_width, scr_height, tile_width, tile_height):
         for y in range(0, scr_height, tile_height):
             paint_tile(screen, x, x + tile_width, y, y + tile_height)
 
-    # Sets display to painted screen
-    pygame.display.flip()
-
 
 def paint_tile_screen(screen, scr_width, scr_height, tile_width, tile_height):
     # Initializes screen to white tiles
     screen.fill('white')
 
-    # Paints the tiles on top of white screen 
+    # Paints the tiles on top of white screen
     paint_tiles(screen, scr_width, scr_height, tile_width, tile_height)
 
+    # Sets display to painted screen
+    pygame.display.flip()
+
 
 def paint_tile(screen, x_start, x_end, y_start, y_end):
-    # Paint top and bottom edges of tile
-    for x in range(x_start, x_end):
-        screen.set_at((x, y_start), 'black')
-        screen.set_at((x, y_end - 1), 'black')
-
-    # Paint left and right edges of tile
-    for y in range(y_start, y_end):
-        screen.set_at((x_start, y), 'black')
-        screen.set_at((x_end - 1, y), 'black')
+    # Paints the one pixel wide edges of the tile
+    pygame.draw.rect(screen, 'black', (x_start, y_start, x_end - x_start, y_end - y_start), 1)
+
+
+# Transparent surface holding only the tile borders, to blit on top of whatever is drawn under them
+def grid_overlay(scr_width, scr_height, tile_width, tile_height):
+    overlay = pygame.Surface((scr_width, scr_height))
+    overlay.fill(GRID_COLORKEY)
+    paint_tiles(overlay, scr_width, scr_height, tile_width, tile_height)
+    overlay.set_colorkey(GRID_COLORKEY)
+
+    return overlay
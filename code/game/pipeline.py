@@ -0,0 +1,192 @@
+import copy
+import queue
+import random
+import sys
+import time
+import torch
+import torch.multiprocessing as multiprocessing
+from board import STATE_SIZE
+from dqn import QAgent, SharedReplayMemory
+from game import ACTION_SPACE, BATCH_SIZE, MEM_CAP, UPDATE_RATE, TARGET_UPDATE_EVERY, EPSILON_HI, GAMMA, \
+    OPTIMIZE_RATE, run_levels
+from level_config import NUM_LEVELS
+from plot import plot_results
+from tile import NUM_TILES
+
+# Asynchronous actor/learner training. Instead of game.run_agent() stepping the board and optimizing in
+# turn, actor processes play the curriculum on headless boards (each as game.run_levels() would, with its
+# own layouts) and push their transitions into a replay memory in shared memory, while the learner (the
+# main process) trains from that memory without pause and publishes its policy weights every
+# PUBLISH_EVERY gradient steps. Actors act on a copy of the policy that they refresh every REFRESH_EVERY
+# steps. Training ends once every actor has passed the last level.
+#
+# Usage: python3 pipeline.py --actors 4 (also takes --mini, --num_levels, --no_curriculum, --compact_replay,
+# --mem_cap and --seed as game.py does)
+
+NUM_ACTORS = 2
+PUBLISH_EVERY = 10  # gradient steps between weight publications
+REFRESH_EVERY = 50  # actor steps between weight refreshes
+
+
+# The learner's latest policy weights in shared memory, with the number of publications so far
+class PolicyBroadcast(object):
+    def __init__(self, net, lock):
+        self.net = copy.deepcopy(net).share_memory()
+        self.version = torch.zeros(1, dtype=torch.long).share_memory_()
+        self.lock = lock
+
+    def publish(self, net):
+        with self.lock, torch.no_grad():
+            for shared, param in zip(self.net.parameters(), net.parameters()):
+                shared.copy_(param)
+            self.version += 1
+
+    def fetch(self, net):  # copy the latest weights into `net`, returns their version
+        with self.lock:
+            net.load_state_dict(self.net.state_dict())
+            return int(self.version)
+
+
+# QAgent that only acts: its transitions go to the shared memory, it never trains, and it refreshes its
+# policy from the learner's broadcast every `refresh_every` steps (only if new weights were published)
+class ActorAgent(QAgent):
+    def __init__(self, broadcast, refresh_every, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broadcast = broadcast
+        self.refresh_every = refresh_every
+        self.version = self.broadcast.fetch(self.policy_net)
+
+    def select_action(self, state):
+        if self.steps_done % self.refresh_every == 0 and int(self.broadcast.version) != self.version:
+            self.version = self.broadcast.fetch(self.policy_net)
+        return super().select_action(state)
+
+    def optimize_model(self):
+        pass
+
+    def update_target_weights(self):
+        pass
+
+
+# Play the curriculum in an actor process and put (actor index, game.run_levels() results) on `results`
+def run_actor(index, levels, mini, seed, memory, broadcast, num_tiles, results):
+    torch.set_num_threads(1)  # actors only run single states through the network
+
+    agent = ActorAgent(broadcast, REFRESH_EVERY, STATE_SIZE, len(ACTION_SPACE), ACTION_SPACE, \
+                       epsilon=EPSILON_HI, num_tiles=num_tiles, seed=seed, memory=memory)
+    results.put((index, run_levels(levels, False, mini, headless=True, seed=seed, agent=agent)))
+
+
+# Train one learner from `num_actors` actor processes. Returns the results of every actor, as
+# game.run_levels() returns them
+def run_pipeline(levels, mini, num_actors=NUM_ACTORS, seed=None, mem_cap=MEM_CAP, num_tiles=None):
+    rng = random.Random(seed)
+    # spawn, not fork: forking a process that has already initialized torch is unsafe
+    context = multiprocessing.get_context('spawn')
+
+    memory_size, memory_dtype = STATE_SIZE, torch.float32
+    if num_tiles is not None:
+        memory_size, memory_dtype = STATE_SIZE // num_tiles, torch.uint8
+    memory = SharedReplayMemory(mem_cap, memory_size, context.Lock(), dtype=memory_dtype)
+    learner = QAgent(STATE_SIZE, len(ACTION_SPACE), ACTION_SPACE, batch_size=BATCH_SIZE, op_lr=OPTIMIZE_RATE, \
+                     gamma=GAMMA, weight_update_rate=UPDATE_RATE, target_update_every=TARGET_UPDATE_EVERY, \
+                     num_tiles=num_tiles, seed=rng.randrange(2 ** 32), memory=memory)
+    broadcast = PolicyBroadcast(learner.policy_net, context.Lock())
+
+    results = context.Queue()
+    actors = [context.Process(target=run_actor, args=(i, levels, mini, rng.randrange(2 ** 32), memory, broadcast, \
+                                                      num_tiles, results)) for i in range(num_actors)]
+    for actor in actors:
+        actor.start()
+
+    # Train until every actor has reported its results (actors only exit once these are read)
+    results_by_actor = [None] * num_actors
+    num_done = 0
+    num_grad_steps = 0
+    while num_done < num_actors:
+        if len(memory) >= BATCH_SIZE:
+            learner.optimize_model()
+            learner.update_target_weights()
+            num_grad_steps += 1
+            if num_grad_steps % PUBLISH_EVERY == 0:
+                broadcast.publish(learner.policy_net)
+        else:
+            time.sleep(0.01)  # wait for the actors to fill the memory
+
+        try:
+            index, actor_results = results.get_nowait()
+            results_by_actor[index] = actor_results
+            num_done += 1
+        except queue.Empty:
+            if not any(actor.is_alive() for actor in actors) and results.empty():
+                sys.stderr.write('ERROR: an actor process exited without results\n')
+                exit(1)
+
+    for actor in actors:
+        actor.join()
+    print(f"Learner took {num_grad_steps} gradient steps on {len(memory)} stored transitions")
+
+    return results_by_actor
+
+
+def main():
+    mini = '--mini' in sys.argv
+    curriculum = '--no_curriculum' not in sys.argv
+    num_actors = NUM_ACTORS
+    num_levels = NUM_LEVELS
+    num_tiles = None
+    mem_cap = MEM_CAP
+    seed = None
+    # command line option for the number of actor processes
+    if '--actors' in sys.argv:
+        flag_idx = sys.argv.index('--actors')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--actors needs to be followed by a number\n')
+            exit(1)
+        num_actors = int(sys.argv[flag_idx + 1])
+        if num_actors < 1:
+            sys.stderr.write('--actors needs to be at least 1\n')
+            exit(1)
+    # command line option for stopping at a certain level
+    if '--num_levels' in sys.argv:
+        flag_idx = sys.argv.index('--num_levels')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--num_levels needs to be followed by a number\n')
+            exit(1)
+        num_levels = int(sys.argv[flag_idx + 1])
+        if num_levels < 1 or num_levels > NUM_LEVELS:
+            sys.stderr.write(f'num_levels needs to be between 1 and {NUM_LEVELS}\n')
+            exit(1)
+    # command line option for storing uint8 tile indices instead of one-hot features in replay memory
+    if '--compact_replay' in sys.argv:
+        num_tiles = NUM_TILES
+    # command line option for the number of transitions replay memory holds
+    if '--mem_cap' in sys.argv:
+        flag_idx = sys.argv.index('--mem_cap')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--mem_cap needs to be followed by a number\n')
+            exit(1)
+        mem_cap = int(sys.argv[flag_idx + 1])
+    # command line option for seeding the learner and the actors
+    if '--seed' in sys.argv:
+        flag_idx = sys.argv.index('--seed')
+        if flag_idx == len(sys.argv) - 1 or not sys.argv[flag_idx + 1].isnumeric():
+            sys.stderr.write('--seed needs to be followed by a number\n')
+            exit(1)
+        seed = int(sys.argv[flag_idx + 1])
+
+    start_level = 1 if curriculum else num_levels
+    levels = range(start_level, num_levels + 1)
+    print(f"Training with {num_actors} actors")
+    results_by_actor = run_pipeline(levels, mini, num_actors, seed, mem_cap, num_tiles)
+
+    rewards_by_actor, episode_lens_by_actor, num_episodes_by_actor = map(list, zip(*results_by_actor))
+    for level_idx, level in enumerate(levels):
+        print(f'Level {level}: ' + ', '.join(f'actor {i + 1} {num_episodes[level_idx]} episodes' \
+                                             for i, num_episodes in enumerate(num_episodes_by_actor)))
+    plot_results(rewards_by_actor, episode_lens_by_actor, num_episodes_by_actor, start_level, \
+                 'Pipeline Agent', 'pipeline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+from objects import UpdateStatus
+
+# Rewards 
+TIMESTEP_REWARD = 0 # reward earned per timestep 
+DEATH_REWARD = -500 # reward earned if chicken dies 
+TREE_REWARD = 0     # reward earned if chicken runs into tree
+FORWARD_REWARD = 5  # reward earned if chicken moves one step closer to finish line
+BACKWARD_REWARD = -6 # reward earned if chicken moves one step farther from finish line 
+WIN_REWARD = 1000 # reward earned if chicken beats the level 
+
+# Statuses that decide the reward of a timestep, in order of precedence 
+OUTCOME_PRECEDENCE = [UpdateStatus.DEATH, UpdateStatus.NO_MOVEMENT, UpdateStatus.WIN]
+
+OUTCOME_REWARDS = {
+    UpdateStatus.SUCCESS: TIMESTEP_REWARD,
+    UpdateStatus.DEATH: DEATH_REWARD,
+    UpdateStatus.NO_MOVEMENT: TREE_REWARD,
+    UpdateStatus.WIN: WIN_REWARD
+}
+
+
+# Collapse the statuses returned by Board.update_board() into the one that decides the reward 
+def get_outcome(statuses):
+    for status in OUTCOME_PRECEDENCE:
+        if status in statuses:
+            return status
+    return UpdateStatus.SUCCESS
+
+
+# Reward for one timestep, given its outcome and the chicken's row before and after the step 
+def get_reward(outcome, prev_y, y):
+    reward = OUTCOME_REWARDS[outcome]
+
+    # Encourage moving forward 
+    if y < prev_y:
+        reward += FORWARD_REWARD 
+    if y > prev_y:
+        reward += BACKWARD_REWARD 
+
+    return reward
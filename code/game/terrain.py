@@ -1,4 +1,4 @@
-import pygame
+from assets import scaled_image
 from config import DISPLAY_WIDTH, TILE_WIDTH, TILE_HEIGHT, BOARD_WIDTH
 from enum import Enum
 
@@ -29,7 +29,7 @@ TERRAIN_FILE_PATHS = {
 
 
 class Terrain:
-    def __init__(self, ttype, y):
+    def __init__(self, ttype, y, headless=False):
         self.ttype = ttype  # terrain type
         self.y = y
 
@@ -40,8 +40,9 @@ class Terrain:
             self.width = DISPLAY_WIDTH
         self.height = TILE_HEIGHT
 
-        self.img = pygame.image.load(TERRAIN_FILE_PATHS[ttype])
-        self.img = pygame.transform.scale(self.img, (self.width, self.height))
+        self.img = None
+        if not headless:
+            self.img = scaled_image(TERRAIN_FILE_PATHS[ttype], (self.width, self.height))
 
     def __is_full_row(self):
         return self.ttype == TerrainType.TRAIN or self.ttype == TerrainType.FINISH
@@ -1,6 +1,7 @@
-from enum import Enum
+from enum import IntEnum
 
-class Tile(Enum):
+# IntEnum so that tiles can be stored directly in compact uint8 numpy grids
+class Tile(IntEnum):
     # grass tiles
     GRASS = 0
     TREE = 1
@@ -0,0 +1,279 @@
+import random
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from config import BOARD_WIDTH, BOARD_HEIGHT, DEATHZONE_GROWTHRATE
+from board import one_hot_tiles, TERRAIN_DEFAULTTILE_MAP, TRAIN_CYCLE_LEN, TRAIN_PHASE_TILES
+from board import LOOKAHEAD, LOOKBEHIND, LOOKLEFT, LOOKRIGHT, NUMFRAMES
+from board import WINDOW_WIDTH, WINDOW_HEIGHT, STATE_SIZE
+from objects import UpdateStatus
+from objects import CAR_LENGTH, LOG_LENGTH
+from reward import OUTCOME_REWARDS, FORWARD_REWARD, BACKWARD_REWARD
+from terrain import TerrainType
+from tile import Tile
+from layout import generate_layout
+
+# Outcome codes returned by VecBoard.step(), STATUSES[code] is the matching UpdateStatus.
+# Same precedence as reward.get_outcome(): DEATH > NO_MOVEMENT > WIN > SUCCESS
+SUCCESS, DEATH, WIN, NO_MOVEMENT = range(4)
+STATUSES = [UpdateStatus.SUCCESS, UpdateStatus.DEATH, UpdateStatus.WIN, UpdateStatus.NO_MOVEMENT]
+STATUS_REWARDS = np.array([OUTCOME_REWARDS[status] for status in STATUSES])
+
+# chicken displacement indexed by Action value (STAY, LEFT, RIGHT, UP, DOWN)
+ACTION_DX = np.array([0, -1, 1, 0, 0])
+ACTION_DY = np.array([0, 0, 0, -1, 1])
+
+
+# Cars or logs of every board, flattened into one set of arrays. Mirrors Car / Log: the right
+# end `x2` moves by `vel` every `rate` timesteps and wraps modulo BOARD_WIDTH + length
+class _Movers:
+    def __init__(self, length, tile):
+        self.length = length
+        self.tile = tile
+        self.board, self.y, self.start, self.vel, self.rate = [np.empty(0, dtype=np.int64) for _ in range(5)]
+        self.x2, self.counter = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # replace every mover of the boards in `boards` with `movers`, a list of [board, start_x, y, vel, mov_rate]
+    def replace(self, boards, movers):
+        keep = ~np.isin(self.board, boards)
+        new = np.array(movers, dtype=np.int64).reshape(-1, 5)
+        self.board = np.concatenate([self.board[keep], new[:, 0]])
+        self.start = np.concatenate([self.start[keep], new[:, 1]])
+        self.y = np.concatenate([self.y[keep], new[:, 2]])
+        self.vel = np.concatenate([self.vel[keep], new[:, 3]])
+        self.rate = np.concatenate([self.rate[keep], new[:, 4]])
+        self.x2 = np.concatenate([self.x2[keep], new[:, 1] + self.length])
+        self.counter = np.concatenate([self.counter[keep], new[:, 4]])
+
+    def reset(self, board_mask):
+        sel = board_mask[self.board]
+        self.x2[sel] = self.start[sel] + self.length
+        self.counter[sel] = self.rate[sel]
+
+    def will_move(self, board_mask):  # movers that move on the next call to move()
+        return board_mask[self.board] & (self.counter == 1)
+
+    def move(self, board_mask):
+        sel = board_mask[self.board]
+        self.counter[sel] -= 1
+        moving = sel & (self.counter == 0)
+        self.x2[moving] = (self.x2[moving] + self.vel[moving]) % (BOARD_WIDTH + self.length)
+        self.counter[moving] = self.rate[moving]
+
+    def covers(self, xs, ys):  # whether each mover covers the cell (xs[i], ys[i]) of its own board
+        x1 = self.x2 - self.length
+        return (self.y == ys[self.board]) & (x1 <= xs[self.board]) & (xs[self.board] < self.x2)
+
+    def draw(self, grids):
+        for k in range(self.length):
+            xs = self.x2 - self.length + k
+            visible = (0 <= xs) & (xs < BOARD_WIDTH)
+            grids[self.board[visible], xs[visible], self.y[visible]] = self.tile
+
+
+# Steps `num_boards` independent boards of one level in lockstep. Every board is generated by the same
+# level_config rules as Board and follows the same update rules (see Board.update_board()), but all
+# objects are stored as arrays across boards and updated at once. Layouts are generated from seeds
+# drawn from the VecBoard's own generator, seeded with `seed`.
+class VecBoard:
+    def __init__(self, level, num_boards, mini=False, seed=None):
+        self.level = level
+        self.num_boards = num_boards
+        self.mini = mini
+        self.rng = random.Random(seed)
+
+        self.terrain = np.empty((num_boards, BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)  # terrain only
+        self.base = np.empty((num_boards, BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)  # terrain + trees + lilypads
+        self.trees = np.zeros((num_boards, BOARD_WIDTH, BOARD_HEIGHT), dtype=bool)
+
+        self.chicken_x = np.full(num_boards, BOARD_WIDTH // 2)
+        self.chicken_y = np.full(num_boards, BOARD_HEIGHT - 1)
+
+        self.cars = _Movers(CAR_LENGTH, Tile.CAR)
+        self.logs = _Movers(LOG_LENGTH, Tile.LOG)
+        self.train_board, self.train_y = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        self.train_start, self.train_counter = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        self.deathzone_y = np.full(num_boards, BOARD_HEIGHT)
+        self.deathzone_counter = np.full(num_boards, DEATHZONE_GROWTHRATE)
+
+        # Ring buffer of frames shared by all boards, see Board.tiles
+        self.frames = np.empty((num_boards, 2 * NUMFRAMES, BOARD_WIDTH, BOARD_HEIGHT), dtype=np.uint8)
+        self.head = 0
+        self.padded = np.empty((num_boards, NUMFRAMES, BOARD_WIDTH + LOOKLEFT + LOOKRIGHT, \
+                                BOARD_HEIGHT + LOOKBEHIND + LOOKAHEAD), dtype=np.uint8)
+        self.padded[:, :, :, :LOOKBEHIND] = Tile.OOB
+        self.padded[:, :, :, LOOKBEHIND + BOARD_HEIGHT:] = Tile.DEATH
+        self.padded[:, :, :LOOKLEFT] = Tile.OOB
+        self.padded[:, :, LOOKLEFT + BOARD_WIDTH:] = Tile.OOB
+
+        self.__new_layouts(np.arange(num_boards))
+
+    # (num_boards, NUMFRAMES, W, H) view of the frame history keyed by number of frames ago
+    @property
+    def tiles(self):
+        return self.frames[:, self.head + NUMFRAMES:self.head:-1]
+
+    # Generate fresh layouts for `boards` and bring them to the state run_level starts an episode in,
+    # i.e. after one call to update_board()
+    def __new_layouts(self, boards):
+        cars, logs, trains = [], [], []
+        for b in boards:
+            layout = generate_layout(self.level, self.mini, self.rng.randrange(2 ** 32))
+
+            for y, ttype in enumerate(layout["terrain"]):
+                self.terrain[b, :, y] = TERRAIN_DEFAULTTILE_MAP[TerrainType(ttype)]
+            self.base[b] = self.terrain[b]
+            self.trees[b] = False
+
+            for kind, *params in layout["objects"]:
+                if kind == "tree":
+                    self.base[b, params[0], params[1]] = Tile.TREE
+                    self.trees[b, params[0], params[1]] = True
+                elif kind == "lilypad":
+                    self.base[b, params[0], params[1]] = Tile.LILYPAD
+                elif kind == "car":
+                    cars.append([b] + params)
+                elif kind == "log":
+                    logs.append([b] + params)
+                elif kind == "train":
+                    trains.append([b] + params)
+
+        self.cars.replace(boards, cars)
+        self.logs.replace(boards, logs)
+        keep = ~np.isin(self.train_board, boards)
+        new = np.array(trains, dtype=np.int64).reshape(-1, 3)
+        self.train_board = np.concatenate([self.train_board[keep], new[:, 0]])
+        self.train_y = np.concatenate([self.train_y[keep], new[:, 1]])
+        self.train_start = np.concatenate([self.train_start[keep], new[:, 2]])
+        self.train_counter = np.concatenate([self.train_counter[keep], new[:, 2]])
+
+        mask = np.zeros(self.num_boards, dtype=bool)
+        mask[boards] = True
+        self.__reset_objects(mask)
+
+        # like Board: every frame starts as bare terrain, then one update draws the objects
+        self.frames[boards] = self.terrain[boards, None]
+        self.__move_objects(mask)
+        grids = self.__draw()
+        self.frames[boards, self.head + NUMFRAMES] = grids[boards]
+        self.frames[boards, self.head] = grids[boards]
+
+    def __reset_objects(self, mask):  # reset objects and chickens of the boards in `mask`
+        self.cars.reset(mask)
+        self.logs.reset(mask)
+        sel = mask[self.train_board]
+        self.train_counter[sel] = self.train_start[sel]
+        self.deathzone_y[mask] = BOARD_HEIGHT
+        self.deathzone_counter[mask] = DEATHZONE_GROWTHRATE
+        self.chicken_x[mask] = BOARD_WIDTH // 2
+        self.chicken_y[mask] = BOARD_HEIGHT - 1
+
+    def __move_objects(self, mask):  # advance objects of the boards in `mask` by one timestep
+        self.cars.move(mask)
+        self.logs.move(mask)
+        self.train_counter[mask[self.train_board]] += 1
+        self.deathzone_counter[mask] -= 1
+        grow = mask & (self.deathzone_counter == 0)
+        self.deathzone_y[grow] -= 1
+        self.deathzone_counter[grow] = DEATHZONE_GROWTHRATE
+
+    def __draw(self):  # current tiles of every board, drawn from the object state
+        grids = self.base.copy()
+        self.logs.draw(grids)
+        self.cars.draw(grids)
+        grids[self.train_board, :, self.train_y] = \
+            TRAIN_PHASE_TILES[self.train_counter % TRAIN_CYCLE_LEN][:, None]
+        in_deathzone = np.arange(BOARD_HEIGHT) >= self.deathzone_y[:, None]
+        grids[np.broadcast_to(in_deathzone[:, None, :], grids.shape)] = Tile.DEATH
+        return grids
+
+    def reset(self):
+        self.__new_layouts(np.arange(self.num_boards))
+        return self.extract_features()
+
+    # (num_boards,) + WINDOW_SHAPE uint8 windows centred on each chicken, see Board.extract_tile_window
+    def extract_tile_windows(self):
+        self.padded[:, :, LOOKLEFT:LOOKLEFT + BOARD_WIDTH, LOOKBEHIND:LOOKBEHIND + BOARD_HEIGHT] = self.tiles
+        windows = sliding_window_view(self.padded, (WINDOW_WIDTH, WINDOW_HEIGHT), axis=(2, 3))
+        return windows[np.arange(self.num_boards), :, self.chicken_x, self.chicken_y]
+
+    # (num_boards, STATE_SIZE) float32 one-hot features, written into `out` if given
+    def extract_features(self, out=None):
+        if out is None:
+            out = np.empty((self.num_boards, STATE_SIZE), dtype=np.float32)
+        return one_hot_tiles(self.extract_tile_windows(), out)
+
+    # Move every chicken by `actions` (Action values) and advance every board by one timestep.
+    # Boards whose chicken won start a new episode on a fresh layout. Returns the observations
+    # (num_boards, STATE_SIZE), rewards, dones and outcome codes (see STATUSES)
+    def step(self, actions):
+        actions = np.asarray(actions)
+        all_boards = np.ones(self.num_boards, dtype=bool)
+        prev_x, prev_y = self.chicken_x.copy(), self.chicken_y.copy()
+
+        # Move chickens (Chicken.move never leaves the board)
+        self.chicken_x = np.clip(prev_x + ACTION_DX[actions], 0, BOARD_WIDTH - 1)
+        self.chicken_y = np.clip(prev_y + ACTION_DY[actions], 0, BOARD_HEIGHT - 1)
+        boards = np.arange(self.num_boards)
+
+        won = self.chicken_y == 0
+
+        # running into a tree undoes the move. After running down into a tree, the objects of the chicken's row 
+        # neither carry nor hit it this timestep (see Board.update_board())
+        blocked = self.trees[boards, self.chicken_x, self.chicken_y]
+        blocked_down = blocked & (self.chicken_y > prev_y)
+        self.chicken_x[blocked] = prev_x[blocked]
+        self.chicken_y[blocked] = prev_y[blocked]
+
+        # logs carry the chicken along when they move, possibly off the board. Like Board, the logs of the
+        # chicken's row carry it in list order, so a log it is carried onto carries it again if it comes
+        # later: the k-th such log of every board is checked in round k
+        in_row = np.flatnonzero(self.logs.will_move(all_boards) & (self.logs.y == self.chicken_y[self.logs.board]) & \
+                                ~blocked_down[self.logs.board])
+        in_row = in_row[np.argsort(self.logs.board[in_row], kind='stable')]  # grouped by board, in list order
+        log_boards = self.logs.board[in_row]
+        ranks = np.arange(len(in_row)) - np.searchsorted(log_boards, log_boards)
+        for rank in range(ranks.max(initial=-1) + 1):
+            logs = in_row[ranks == rank]  # at most one per board
+            xs = self.chicken_x[self.logs.board[logs]]
+            carried = logs[(self.logs.x2[logs] - LOG_LENGTH <= xs) & (xs < self.logs.x2[logs])]
+            self.chicken_x[self.logs.board[carried]] += self.logs.vel[carried]
+        died = (self.chicken_x < 0) | (self.chicken_x >= BOARD_WIDTH)
+
+        self.__move_objects(all_boards)
+
+        # draw the new frame into the ring buffer
+        self.head = (self.head + 1) % NUMFRAMES
+        grids = self.__draw()
+        self.frames[:, self.head + NUMFRAMES] = grids
+        self.frames[:, self.head] = grids
+
+        # cars, trains and the death zone kill on contact
+        hit = np.zeros(self.num_boards, dtype=bool)
+        hit_cars = self.cars.covers(self.chicken_x, self.chicken_y) & ~blocked_down[self.cars.board]
+        hit[self.cars.board[hit_cars]] = True
+        on_train = (self.train_y == self.chicken_y[self.train_board]) & \
+                   (TRAIN_PHASE_TILES[self.train_counter % TRAIN_CYCLE_LEN] == Tile.TRAIN) & \
+                   ~blocked_down[self.train_board]
+        hit[self.train_board[on_train]] = True
+        died |= hit | (self.chicken_y >= self.deathzone_y)
+
+        # river kill (check tiles)
+        safe_x = np.clip(self.chicken_x, 0, BOARD_WIDTH - 1)
+        died |= grids[boards, safe_x, self.chicken_y] == Tile.WATER
+
+        statuses = np.full(self.num_boards, SUCCESS)
+        statuses[won] = WIN
+        statuses[blocked] = NO_MOVEMENT
+        statuses[died] = DEATH
+
+        self.__reset_objects(died)
+
+        rewards = STATUS_REWARDS[statuses]
+        rewards[self.chicken_y < prev_y] += FORWARD_REWARD
+        rewards[self.chicken_y > prev_y] += BACKWARD_REWARD
+
+        dones = statuses == WIN
+        if dones.any():
+            self.__new_layouts(np.flatnonzero(dones))
+
+        return self.extract_features(), rewards, dones, statuses